@@ -1,3 +1,18 @@
 # flake8: noqa
-from crunch import util
-from crunch.crunch import start_processes
+import importlib
+
+# The attributes of the package and the modules they are defined in. The modules are imported on first use,
+# so a process only imports what it needs, e.g. the eyetracker process never imports the forecasting stack
+_lazy_attributes = {
+    "util": "crunch.util",
+    "start_processes": "crunch.crunch",
+}
+
+
+def __getattr__(name):
+    if name not in _lazy_attributes:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(_lazy_attributes[name])
+    value = module if module.__name__ == f"{__name__}.{name}" else getattr(module, name)
+    globals()[name] = value
+    return value
@@ -1,17 +1,24 @@
 from multiprocessing import Process
-from crunch.websocket.websocket import WebSocketServer
 
-from crunch.empatica import start_empatica
-from crunch.eyetracker import start_eyetracker
+import crunch.util as util
 
 
 def start_processes(mobile):
-    p1 = Process(target=start_empatica)
+    # Imported here, so the processes started by spawn only import the packages they need
+    from crunch.empatica import start_empatica
+    from crunch.eyetracker import start_eyetracker
+    from crunch.transport import MeasurementTransport
+    from crunch.websocket.websocket import WebSocketServer
+
+    # The sensor processes send their measurements to the websocket server through shared memory
+    transport = MeasurementTransport() if util.config("transport", "enabled") == "True" else None
+
+    p1 = Process(target=start_empatica, kwargs={"transport": transport})
     # Uncomment line below to start Empatica
     # p1.start()
 
-    p2 = Process(target=start_eyetracker)
+    p2 = Process(target=start_eyetracker, kwargs={"transport": transport})
     p2.start()
-    websocket = WebSocketServer()
+    websocket = WebSocketServer(transport)
 
     websocket.start_websocket()
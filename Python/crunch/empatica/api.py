@@ -1,27 +1,54 @@
-import socket
-import time
+import asyncio
+import random
+import signal
+
+import numpy as np
 
 import crunch.util as util
 from crunch.empatica.handler import DataHandler  # noqa
+from crunch.empatica.parser import StreamParser
+from crunch.empatica.window_store import WindowStore
 
 
 class EmpaticaAPI:
     """
-    EmpaticaAPI is responsible for connecting to and receiving data from the
-    empatica E4 wristband, and then the API sends the data to all subscribed
-    handlers. The class communicates with a streaming server to get the data
+    EmpaticaAPI is responsible for connecting to and receiving data from one or more
+    empatica E4 wristbands, and then the API sends the data to all subscribed
+    handlers. The class communicates with a streaming server to get the data.
+    The data of each stream is stored once, in a WindowStore shared by all handlers of the stream.
+
+    The streaming server binds each connection to a single device, so the API opens one
+    connection per device. All of them run on the same asyncio event loop in one process,
+    and each device has its own set of subscribers. When the connection to the server
+    or a device is lost, the API reconnects that device with a jittered exponential backoff
+    instead of blocking the process, and stop() shuts all connections down cleanly.
     """
-    serverAddress = util.config('empatica', 'address')
-    serverPort = int(util.config('empatica', 'port'))
-    bufferSize = int(util.config('empatica', 'buffersize'))
-    deviceID = util.config('empatica', 'deviceid')
-
-    socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    connected = False
-
-    subscribers = {"EDA": [], "IBI": [], "TEMP": [], "HR": []}
+    # The streams requested from the server once the device is connected
+    streams = ["gsr", "tmp", "ibi", "bvp", "acc"]
+    # The raw data handlers can subscribe to
+    raw_data = ["EDA", "IBI", "TEMP", "HR", "BVP", "ACC"]
 
-    def add_subscriber(self, data_handler, requested_data):
+    def __init__(self, device_ids=None):
+        """
+        :param device_ids: the wristbands to stream from, defaults to the device ids in the config file
+        :type device_ids: list of str
+        """
+        self.serverAddress = util.config('empatica', 'address')
+        self.serverPort = int(util.config('empatica', 'port'))
+        self.bufferSize = int(util.config('empatica', 'buffersize'))
+        configured = [device_id.strip() for device_id in util.config('empatica', 'deviceid').split(",")]
+        self.device_ids = list(device_ids or configured)
+        self.timeout = float(util.config('empatica', 'timeout'))
+        self.reconnect_delay = float(util.config('empatica', 'reconnect_delay'))
+        self.max_reconnect_delay = float(util.config('empatica', 'max_reconnect_delay'))
+
+        self.subscribers = {device_id: {name: WindowStore() for name in self.raw_data}
+                            for device_id in self.device_ids}
+        self._loop = None
+        self._stop_event = None
+        self._received_data = {}
+
+    def add_subscriber(self, data_handler, requested_data, device_id=None):
         """
         Adds a handler as a subscriber for a specific raw data
 
@@ -29,108 +56,153 @@ class EmpaticaAPI:
         :type data_handler: DataHandler
         :param requested_data: The specific raw data that the data handler subscribes to
         :type requested_data: str
+        :param device_id: The wristband the data comes from, defaults to the first device
+        :type device_id: str
         """
-        assert requested_data in self.subscribers.keys()
-        self.subscribers[requested_data].append(data_handler)
+        subscribers = self.subscribers[device_id or self.device_ids[0]]
+        assert requested_data in subscribers.keys()
+        subscribers[requested_data].add_handler(data_handler)
 
     def connect(self):
-        """ Connect to the empatica wristband """
-        self.socket.settimeout(3)
-        self._connect_socket()
-        self._subscribe_to_socket()
-        self._stream()
-
-    def _connect_socket(self):
-        """ Create the socket connection and connect the device to the socket """
-        if not self.connected:
-            self.socket.connect((self.serverAddress, self.serverPort))
-            self.connected = True
-
-        self.socket.send("device_list\r\n".encode())
-        response = self.socket.recv(self.bufferSize)
-
-        if self.deviceID not in response.decode("utf-8"):
-            print("Device not available, reconnecting in 10 sec...")
-            time.sleep(10)
-            return self.connect()
-
-        self.socket.send(("device_connect " + self.deviceID + "\r\n").encode())
-        self.socket.recv(self.bufferSize)
-
-        self.socket.send("pause ON\r\n".encode())
-        self.socket.recv(self.bufferSize)
-
-    def _subscribe_to_socket(self):
-        """ Subscribe to the data on the socket connection """
-        self.socket.send(("device_subscribe " + 'gsr' + " ON\r\n").encode())
-        self.socket.recv(self.bufferSize)
-
-        self.socket.send(("device_subscribe " + 'tmp' + " ON\r\n").encode())
-        self.socket.recv(self.bufferSize)
+        """ Connect to the empatica wristbands, and keep streaming data until stop() is called """
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            pass
+
+    def stop(self):
+        """ Stop streaming and close the connections. Safe to call from any thread """
+        if self._loop is not None and self._stop_event is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+
+    async def run(self):
+        """ Stream data from all wristbands until stop() is called """
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(signum, self._stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                # Signal handlers are not supported on Windows or outside the main thread
+                pass
+
+        await asyncio.gather(*(self._run_device(device_id) for device_id in self.device_ids))
+
+    async def _run_device(self, device_id):
+        """ Stream data from a wristband, and reconnect with backoff whenever the connection is lost """
+        delay = self.reconnect_delay
+        while not self._stop_event.is_set():
+            self._received_data[device_id] = False
+            session = asyncio.ensure_future(self._session(device_id))
+            stopped = asyncio.ensure_future(self._stop_event.wait())
+            await asyncio.wait({session, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            stopped.cancel()
+
+            if self._stop_event.is_set():
+                session.cancel()
+                await asyncio.gather(session, return_exceptions=True)
+                break
 
-        self.socket.send(("device_subscribe " + 'ibi' + " ON\r\n").encode())
-        self.socket.recv(self.bufferSize)
+            try:
+                session.result()
+            except asyncio.TimeoutError:
+                print(f"{device_id}: Socket timeout")
+            except (ConnectionError, OSError) as error:
+                print(f"{device_id}: {error}")
+
+            # A connection that delivered data was healthy, so start the backoff over
+            if self._received_data[device_id]:
+                delay = self.reconnect_delay
+            wait = delay * random.uniform(0.5, 1.5)
+            print(f"{device_id}: Reconnecting in {wait:.1f} sec...")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _session(self, device_id):
+        """ Connect to the streaming server and the device, subscribe to the data and stream it """
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.serverAddress, self.serverPort), self.timeout)
+        # A new parser for every connection, so an incomplete line of the last connection is dropped
+        parser = StreamParser()
+        try:
+            await self._connect_device(reader, writer, parser, device_id)
+            await self._stream(reader, parser, device_id)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
 
+    async def _connect_device(self, reader, writer, parser, device_id):
         """
-        UNUSED DATA POINTS
-        self.socket.send(("device_subscribe " + 'bvp' + " ON\r\n").encode())
-        self.socket.recv(self.bufferSize)
-
-        self.socket.send(("device_subscribe " + 'acc' + " ON\r\n").encode())
-        self.socket.recv(self.bufferSize)
+        Connect the device to the socket and subscribe to the data on the socket connection.
+        The commands are pipelined, i.e. all of them are sent before the responses are read
         """
+        writer.write(b"device_list\r\n")
+        await writer.drain()
+        responses = await self._read_responses(reader, parser, 1, device_id)
+        if not any(device_id in response for response in responses):
+            raise ConnectionError("Device not available")
+
+        commands = [f"device_connect {device_id}", "pause ON"]
+        commands += [f"device_subscribe {stream} ON" for stream in self.streams]
+        commands.append("pause OFF")
+        writer.write("".join(command + "\r\n" for command in commands).encode())
+        await writer.drain()
+
+        for response in await self._read_responses(reader, parser, len(commands), device_id):
+            if "ERR" in response:
+                raise ConnectionError(f"Streaming server refused the command: {response}")
+
+    async def _read_responses(self, reader, parser, count, device_id):
+        """
+        Read from the socket until the server has responded to [count] commands.
+        Samples that arrive in the same chunks are sent to the subscribers.
+        """
+        responses = []
+        while len(responses) < count:
+            responses += self._handle_chunk(await self._recv(reader), parser, device_id)
+        return responses
 
-        self.socket.send("pause OFF\r\n".encode())
-        self.socket.recv(self.bufferSize)
-
-    def _stream(self):
+    async def _stream(self, reader, parser, device_id):
         """ Continuously receive data from the socket connection """
         while True:
-            try:
-                response = self.socket.recv(self.bufferSize).decode("utf-8")
-                if "connection lost to device" in response:
-                    print("Lost connection to device, reconnecting in 10 sec...")
-                    time.sleep(10)
-                    return self.connect()
-                if "turned off via button" in response:
-                    print("The wristband was turned off, reconnecting in 10 sec...")
-                    time.sleep(10)
-                    return self.connect()
-
-                samples = response.split("\n")
-                for i in range(len(samples) - 1):
-                    name = samples[i].split()[0]
-                    data = float(samples[i].split()[2].replace(',', '.'))
-                    if name == "E4_Temperature":
-                        self._send_data_to_subscriber("TEMP", data)
-                    elif name == "E4_Gsr":
-                        self._send_data_to_subscriber("EDA", data)
-                    elif name == "E4_Hr":
-                        self._send_data_to_subscriber("HR", data)
-                    elif name == "E4_Ibi":
-                        self._send_data_to_subscriber("IBI", data)
-
-                    """
-                    UNUSED DATA POINTS
-                    if name == "E4_Bvp":
-                        self.send_data_to_subscriber("BVP", data)
-                    if name == "E4_Acc":
-                        self.send_data_to_subscriber("ACC", data)
-                    """
-
-            except socket.timeout:
-                print("Socket timeout, reconnecting in 10 sec...")
-                time.sleep(10)
-                return self.connect()
-
-    def _send_data_to_subscriber(self, name, data):
+            self._handle_chunk(await self._recv(reader), parser, device_id)
+
+    async def _recv(self, reader):
+        """ Receive a chunk from the socket, or raise if the server is silent for too long or disconnects """
+        chunk = await asyncio.wait_for(reader.read(self.bufferSize), self.timeout)
+        if not chunk:
+            raise ConnectionError("The streaming server closed the connection")
+        return chunk
+
+    def _handle_chunk(self, chunk, parser, device_id):
+        """ Parse a chunk, send the samples to the subscribers and return the server messages """
+        samples, messages = parser.feed(chunk)
+        for message in messages:
+            if "connection lost to device" in message:
+                raise ConnectionError("Lost connection to device")
+            if "turned off via button" in message:
+                raise ConnectionError("The wristband was turned off")
+        for name, values in samples.items():
+            self._received_data[device_id] = True
+            self._send_data_to_subscriber(name, np.asarray(values, dtype=float), device_id)
+        return messages
+
+    def _send_data_to_subscriber(self, name, data, device_id):
         """
-        Sends the specified data to all handlers that are subscribing to it
+        Sends the specified data to the window store of the device, which hands the windows
+        to all handlers that are subscribing to it
 
-        :param name: The name of the data point we are sending
+        :param name: The name of the data points we are sending
         :type name: str
-        :param data: The datapoint we are sending
-        :type data: float
+        :param data: All data points of this name received in one chunk, ACC data has one row per sample
+        :type data: np.ndarray
+        :param device_id: The wristband the data comes from
+        :type device_id: str
         """
-        for handler in self.subscribers[name]:
-            handler.add_data_point(data)
+        self.subscribers[device_id][name].add_data_points(data)
@@ -1,23 +1,30 @@
+import threading
 from collections import deque
 
 import numpy as np
 
 import crunch.util as util
+from crunch.empatica.window_store import WindowStore
 
 
 class DataHandler:
     """
     Class that subscribes to a specific raw data stream,
-    handles storing the data,
+    gets windows of the data from the WindowStore of the stream,
     preprocessing the data,
-    and calculating measurements from the data
+    and calculating measurements from the data.
+
+    With an executor, the measurement of each window is computed by a worker of the executor,
+    so the thread that reads the socket is never blocked by the computation. The results are still
+    handled in window order, as soon as the result of every earlier window is ready.
     """
     def __init__(self, measurement_func=None, measurement_path=None,
                  window_length=None, window_step=None,
-                 baseline_length=None, header_features=[]):
+                 baseline_length=None, header_features=[], executor=None):
         """
-        :param measurement_func: the function we call to compute measurements from the raw data
-        :type measurement_func: (list) -> any
+        :param measurement_func: the function we call to compute measurements from the raw data.
+        It gets a read-only view of the window, which must be copied if the function keeps it
+        :type measurement_func: (np.ndarray) -> any
         :param measurement_path: path to the output csv file
         :type measurement_path: str
         :param window_length: length of the window, i.e number of data points for the function
@@ -27,11 +34,15 @@ class DataHandler:
         :type window_step: int
         :param baseline_length: Amount of data points required to calculate baseline
         :type baseline_length: int
+        :param executor: computes the measurements of the windows, or None to compute them inline.
+        The measurement function must not keep state between windows when an executor is used
+        :type executor: concurrent.futures.Executor
         """
         assert window_length and window_step and measurement_func and baseline_length, \
             "Need to supply the required parameters"
 
-        self.data_queue = deque(maxlen=window_length)
+        # Only used when data points are added directly to the handler, see add_data_points
+        self.window_store = None
         self.data_counter = 0
         self.window_step = window_step
         self.window_length = window_length
@@ -40,35 +51,98 @@ class DataHandler:
         self.baseline_length = baseline_length
         self.baseline = None
         self.header_features = header_features
-        self._handle_datapoint = self._calculate_baseline
+        self.executor = executor
+        # The futures of the windows submitted to the executor, and their data counters, in window order
+        self._pending = deque()
+        self._pending_lock = threading.Lock()
+        self._handle_measurement = self._calculate_baseline
 
     def add_data_point(self, datapoint):
         """ Receive a new data point, and call appropriate measurement function when we have enough points """
-        self.data_queue.append(datapoint)
-        self.data_counter += 1
-        self._handle_datapoint()
-
-    def _calculate_baseline(self):
-        """ Calculates a baseline if we have received enough data points """
-        if self.data_counter % self.window_step == 0 and len(self.data_queue) == self.window_length:
-            measurement = util.to_list(self.measurement_func(list(self.data_queue)))
-            if self.baseline is None:
-                self.baseline = [[feature] for feature in measurement]
-            else:
-                for baseline_feature, feature in zip(self.baseline, measurement):
-                    baseline_feature.append(feature)
+        self.add_data_points([datapoint])
+
+    def add_data_points(self, datapoints):
+        """
+        Receive a batch of data points, and call the appropriate measurement function
+        for every window boundary the batch crosses. Used when the handler is not subscribed
+        to an api, which stores the data for all its handlers in a shared WindowStore instead.
+
+        :param datapoints: the data points received in one chunk
+        :type datapoints: np.ndarray or list of float
+        """
+        if self.window_store is None:
+            self.window_store = WindowStore()
+            self.window_store.add_handler(self)
+        self.window_store.add_data_points(datapoints)
+
+    def add_window(self, window, data_counter):
+        """
+        Receive a complete window from the window store, and compute its measurement,
+        either inline or on the executor
+
+        :param window: read-only view of the latest window_length data points
+        :type window: np.ndarray
+        :param data_counter: number of data points received when the window was completed
+        :type data_counter: int
+        """
+        if self.executor is None:
+            self._handle_result(self.measurement_func(window), data_counter)
+            return
+
+        # The view is overwritten by the next data points, so the worker gets a copy
+        future = self.executor.submit(self.measurement_func, np.array(window))
+        with self._pending_lock:
+            self._pending.append((future, data_counter))
+        future.add_done_callback(self._handle_finished)
+
+    def _handle_finished(self, _):
+        """ Handle the results of the finished windows that all earlier windows are handled for """
+        with self._pending_lock:
+            while self._pending and self._pending[0][0].done():
+                future, data_counter = self._pending.popleft()
+                try:
+                    measurement = future.result()
+                except Exception as error:
+                    print(f"{self.measurement_path}: Failed to compute measurement: {error!r}")
+                    continue
+                self._handle_result(measurement, data_counter)
+
+    def _handle_result(self, measurement, data_counter):
+        """
+        Use the measurement of a window for the baseline or write it normalized to csv
+
+        :param measurement: the result of the measurement function for the window
+        :type measurement: any
+        :param data_counter: number of data points received when the window was completed
+        :type data_counter: int
+        """
+        self.data_counter = data_counter
+        if self._handle_measurement == self._calculate_baseline and data_counter > self.baseline_length:
+            # Enough data points for the baseline were received before this window
+            self._finish_baseline()
+        self._handle_measurement(util.to_list(measurement))
+
+    def _calculate_baseline(self, measurement):
+        """ Adds a measurement to the baseline, and calculates the baseline if we have received enough data points """
+        if self.baseline is None:
+            self.baseline = [[feature] for feature in measurement]
+        else:
+            for baseline_feature, feature in zip(self.baseline, measurement):
+                baseline_feature.append(feature)
         if self.data_counter >= self.baseline_length:
-            self.baseline = [abs(sum(feature)) / len(feature) for feature in self.baseline]
-            self._handle_datapoint = self._calculate_measurement
-
-    def _calculate_measurement(self):
-        """ Calculates a measurement and writes to csv if we have received enough data points """
-        if self.data_counter % self.window_step == 0 and len(self.data_queue) == self.window_length:
-            measurement = util.to_list(self.measurement_func(list(self.data_queue)))
-            normalized_measurement = np.dot(measurement, np.reciprocal(self.baseline)) / len(self.baseline)
-            if len(measurement) == 1:
-                util.write_csv(self.measurement_path, [normalized_measurement])
-            else:
-                util.write_csv(self.measurement_path,
-                               [normalized_measurement, *measurement],
-                               header_features=self.header_features)
+            self._finish_baseline()
+
+    def _finish_baseline(self):
+        """ Average the measurements of the baseline phase, and start calculating measurements """
+        self.baseline = [abs(sum(feature)) / len(feature) for feature in self.baseline]
+        self._handle_measurement = self._calculate_measurement
+
+    def _calculate_measurement(self, measurement):
+        """ Normalizes a measurement with the baseline and writes to csv """
+        normalized_measurement = np.dot(measurement, np.reciprocal(self.baseline)) / len(self.baseline)
+        if len(measurement) == 1:
+            util.write_csv(self.measurement_path, [normalized_measurement])
+        else:
+            util.write_csv(self.measurement_path,
+                           [normalized_measurement, *measurement],
+                           header_features=self.header_features)
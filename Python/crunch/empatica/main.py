@@ -1,72 +1,158 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import crunch.util as util
 from crunch.empatica.api import EmpaticaAPI
 from crunch.empatica.handler import DataHandler
-from crunch.empatica.measurements import (compute_arousal,
+from crunch.empatica.measurements import (SlidingArousal,
                                           compute_emotional_regulation,
                                           compute_engagement,
                                           compute_entertainment,
+                                          compute_motion, compute_pulse,
                                           compute_stress)
+from crunch.transport import close_transport, set_transport
+from crunch.writer import close_writer
 
 
-def start_empatica(api=EmpaticaAPI):
+def start_empatica(api=EmpaticaAPI, device_ids=None, transport=None):
     """
     start the empatica process control flow.
+
+    :param device_ids: the wristbands to stream from in this process, defaults to the device ids in the config file
+    :type device_ids: list of str
+    :param transport: sends the measurements to the websocket process, if given
+    :type transport: MeasurementTransport
     """
+    set_transport(transport)
+
     # Instantiate the api
-    api = api()
+    api = api(device_ids)
+    executor = create_executor()
+
+    # Each device gets its own set of handlers, with separate output files when there are several devices
+    for device_id in api.device_ids:
+        prefix = f"{device_id}_" if len(api.device_ids) > 1 else ""
+        add_handlers(api, device_id, prefix, executor)
+
+    # start up the api
+    try:
+        api.connect()
+    finally:
+        if executor is not None:
+            # Let the workers finish the windows that are already received, so their results are written
+            executor.shutdown(wait=True)
+        # Processes started by multiprocessing exit without running atexit handlers
+        close_writer()
+        close_transport()
+
 
+def create_executor():
+    """
+    Create the executor that computes the measurements, as configured in the config file
+
+    :return: the executor, or None if the measurements are computed inline
+    :rtype: concurrent.futures.Executor
+    """
+    executor = util.config('empatica', 'executor')
+    workers = int(util.config('empatica', 'workers'))
+    if executor == "process":
+        return ProcessPoolExecutor(workers)
+    if executor == "thread":
+        return ThreadPoolExecutor(workers)
+    assert executor == "inline", f"Unknown executor {executor}"
+    return None
+
+
+def add_handlers(api, device_id, prefix="", executor=None):
+    """
+    Instantiate the data handlers of a device and subscribe them to the api.
+    The sliding measurements keep state between windows, and the measurements of short windows are cheap,
+    so they are always computed inline
+
+    :param device_id: the wristband the handlers get data from
+    :type device_id: str
+    :param prefix: prefix of the output csv files of the handlers
+    :type prefix: str
+    :param executor: computes the measurements of the handlers, or None to compute them inline
+    :type executor: concurrent.futures.Executor
+    """
     # Instantiate the arousal data handler and subscribe to the api
     arousal_handler = DataHandler(
-        measurement_func=compute_arousal,
-        measurement_path="arousal.csv",
+        measurement_func=SlidingArousal(window_step=40),
+        measurement_path=prefix + "arousal.csv",
         window_length=121,
         window_step=40,
         baseline_length=161
     )
-    api.add_subscriber(arousal_handler, "EDA")
+    api.add_subscriber(arousal_handler, "EDA", device_id)
 
     # Instantiate the engagement data handler and subscribe to the api
     engagement_handler = DataHandler(
         measurement_func=compute_engagement,
-        measurement_path="engagement.csv",
+        measurement_path=prefix + "engagement.csv",
         window_length=121,
         window_step=40,
         baseline_length=161,
-        header_features=["amplitude", "nr of peaks", "area under curve of tonic signal"]
+        header_features=["amplitude", "nr of peaks", "area under curve of tonic signal"],
+        executor=executor
     )
-    api.add_subscriber(engagement_handler, "EDA")
+    api.add_subscriber(engagement_handler, "EDA", device_id)
 
-    # Instantiate the emotional regulation data handler and subscribe to the api
+    # Instantiate the emotional regulation data handler and subscribe to the api.
+    # The windows do not overlap, so SlidingEmotionalRegulation would recompute every window anyway
     emreg_handler = DataHandler(
         measurement_func=compute_emotional_regulation,
-        measurement_path="emotional_regulation.csv",
+        measurement_path=prefix + "emotional_regulation.csv",
         window_length=12,
         window_step=12,
         baseline_length=36,
         header_features=["rmssd", "outliers", "mean"]
     )
-    api.add_subscriber(emreg_handler, "IBI")
+    api.add_subscriber(emreg_handler, "IBI", device_id)
 
     # Instantiate the entertainment data handler and subscribe to the api
     entertainment_handler = DataHandler(
         measurement_func=compute_entertainment,
-        measurement_path="entertainment.csv",
+        measurement_path=prefix + "entertainment.csv",
         window_length=20,
         window_step=10,
         baseline_length=30,
         header_features=["mean", "var", "max", "min", "diff", "correlation",
-                         "auto-correlation", "approximate entropy", "fluctuations"]
+                         "auto-correlation", "approximate entropy", "fluctuations"],
+        executor=executor
     )
-    api.add_subscriber(entertainment_handler, "HR")
+    api.add_subscriber(entertainment_handler, "HR", device_id)
 
-    # Instantiate the stress data handler and subscribe to the api
+    # Instantiate the stress data handler and subscribe to the api.
+    # The windows do not overlap, so SlidingStress would recompute every window anyway
     stress_handler = DataHandler(
         measurement_func=compute_stress,
-        measurement_path="stress.csv",
+        measurement_path=prefix + "stress.csv",
         window_length=10,
         window_step=10,
         baseline_length=30
     )
-    api.add_subscriber(stress_handler, "TEMP")
+    api.add_subscriber(stress_handler, "TEMP", device_id)
 
-    # start up the api
-    api.connect()
+    # Instantiate the pulse data handler and subscribe to the api
+    pulse_handler = DataHandler(
+        measurement_func=compute_pulse,
+        measurement_path=prefix + "pulse.csv",
+        window_length=512,
+        window_step=128,
+        baseline_length=2560,
+        header_features=["heart rate", "amplitude"],
+        executor=executor
+    )
+    api.add_subscriber(pulse_handler, "BVP", device_id)
+
+    # Instantiate the motion data handler and subscribe to the api
+    motion_handler = DataHandler(
+        measurement_func=compute_motion,
+        measurement_path=prefix + "motion.csv",
+        window_length=128,
+        window_step=64,
+        baseline_length=1280,
+        header_features=["activity", "artifact ratio"],
+        executor=executor
+    )
+    api.add_subscriber(motion_handler, "ACC", device_id)
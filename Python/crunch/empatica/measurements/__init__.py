@@ -1,7 +1,12 @@
 # flake8: noqa
-from crunch.empatica.measurements.arousal import compute_arousal
-from crunch.empatica.measurements.emotional_regulation import \
-    compute_emotional_regulation
+from crunch.empatica.measurements.arousal import (SlidingArousal,
+                                                  compute_arousal)
+from crunch.empatica.measurements.emotional_regulation import (
+    SlidingEmotionalRegulation, compute_emotional_regulation)
 from crunch.empatica.measurements.engagement import compute_engagement
 from crunch.empatica.measurements.entertainment import compute_entertainment
-from crunch.empatica.measurements.stress import compute_stress
+from crunch.empatica.measurements.motion import compute_motion
+from crunch.empatica.measurements.pulse import compute_pulse
+from crunch.empatica.measurements.stress import (SlidingStress,
+                                                 compute_stress,
+                                                 compute_stress_series)
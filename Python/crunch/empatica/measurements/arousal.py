@@ -1,3 +1,8 @@
+import numpy as np
+
+from crunch.empatica.measurements.sliding import SlidingSum
+
+
 def compute_arousal(eda):
     """
     calculating arousal based on EDA positive change [1]
@@ -19,3 +24,26 @@ def compute_arousal(eda):
             positive_change += eda[i + 1] - eda[i]
 
     return float(positive_change)
+
+
+class SlidingArousal:
+    """
+    Streaming version of compute_arousal for a handler whose window moves window_step data points at a time.
+    Keeps a running sum of the positive changes, so each window costs O(window_step) instead of O(window_length)
+    """
+
+    def __init__(self, window_step):
+        """
+        :param window_step: how many data points the window moves between two calls
+        :type window_step: int
+        """
+        self.positive_change = SlidingSum(window_step, lambda change: np.maximum(change, 0))
+
+    def __call__(self, eda):
+        """
+        :param eda: the eda data points in the window, must be called with every window of the handler
+        :type eda: np.ndarray
+        :return: positive_change - a measure for arousal
+        :rtype: float
+        """
+        return self.positive_change(np.asarray(eda, dtype=float))
@@ -1,15 +1,16 @@
 import numpy as np
 
+from crunch.empatica.measurements.sliding import SlidingSum
+
 
 def compute_percentage_of_ibi_that_differ(ibi):
     """
     Helper for emotional regulation
     :param ibi: list of ibi values
-    :type ibi: list of float
+    :type ibi: np.ndarray or list of float
     :return: percentage of ibi successive ibi values that differs by more than 50ms
     :rtype: float
     """
-    assert type(ibi) == list
     assert len(ibi) > 2
     differs_more = 0
     differs_less = 0
@@ -26,11 +27,10 @@ def compute_rmssd(ibi):
     Helper for emotional regulation
     One way to measure heart rate variability.
     :param ibi: list of ibi values
-    :type ibi: list of float
+    :type ibi: np.ndarray or list of float
     :return: root mean square of successive differences
     :rtype: float
     """
-    assert list == type(ibi)
     assert len(ibi) > 2
     total = 0
     for i in range(1, len(ibi)):
@@ -43,7 +43,7 @@ def compute_normal_ibi(ibi):
     Helper for emotional regulation
     Removes IBI values that are below the 10th percentile and above the 90th percentile.
     :param ibi: list of ibi values
-    :type ibi: list of float
+    :type ibi: np.ndarray or list of float
     :return: a list of ibi values where the 10th and 90th percentile are removed
     :rtype: list of float
     """
@@ -57,7 +57,7 @@ def compute_emotional_regulation(ibi):
     """
     Computes emotional regulation based on a list of IBI values
     :param ibi: list of ibi values
-    :type ibi: list of float
+    :type ibi: np.ndarray or list of float
     :return: a measure of emotional regulation
     :rtype: float, float, float
     """
@@ -65,3 +65,34 @@ def compute_emotional_regulation(ibi):
     percentage_that_differ = compute_percentage_of_ibi_that_differ(ibi)
     normal = compute_normal_ibi(ibi)
     return rmssd, percentage_that_differ, np.average(normal)
+
+
+class SlidingEmotionalRegulation:
+    """
+    Streaming version of compute_emotional_regulation for a handler whose window moves window_step
+    data points at a time. Keeps running sums of the squared successive differences and of the number
+    of successive differences above 50 ms, so these cost O(window_step) per window instead of O(window_length)
+    """
+
+    def __init__(self, window_step):
+        """
+        :param window_step: how many data points the window moves between two calls
+        :type window_step: int
+        """
+        self.squared_differences = SlidingSum(window_step, np.square)
+        self.differs_more = SlidingSum(window_step, lambda difference: (np.abs(difference) > 0.05).astype(float))
+
+    def __call__(self, ibi):
+        """
+        :param ibi: the ibi values in the window, must be called with every window of the handler
+        :type ibi: np.ndarray
+        :return: a measure of emotional regulation
+        :rtype: float, float, float
+        """
+        ibi = np.asarray(ibi, dtype=float)
+        assert len(ibi) > 2
+        differences = len(ibi) - 1
+        rmssd = (max(self.squared_differences(ibi), 0.0) / differences) ** 0.5
+        percentage_that_differ = max(self.differs_more(ibi) / differences, 0.01)
+        normal = compute_normal_ibi(ibi)
+        return rmssd, percentage_that_differ, np.average(normal)
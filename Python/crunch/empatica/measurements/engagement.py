@@ -12,21 +12,22 @@ def compute_engagement(eda):
     Compute three different features correlated with engagement
 
     :param eda: list of eda data points
-    :type eda: list of float
+    :type eda: np.ndarray or list of float
     :return: amplitude, number of peaks of phasic signal, and area under the curve of tonic signal
     :rtype: (float, float, float)
     """
+    eda = np.asarray(eda, dtype=float)
 
     # find tonic and phasic components
     mean_arr = _mean_filter(eda)
     relevant_eda = eda[MEAN_KERNEL_WIDTH: -MEAN_KERNEL_WIDTH]
-    tonic = mean_arr - abs(min(relevant_eda - mean_arr))
+    tonic = mean_arr - abs(np.min(relevant_eda - mean_arr))
     phasic = relevant_eda - tonic
 
     # features
     peak_start, peak_end = _find_peaks(relevant_eda - mean_arr)
     amplitude = _find_amplitude(peak_start, peak_end, phasic)
-    nr_peaks = sum(peak_start)
+    nr_peaks = float(len(peak_start))
     auc = _area_under_curve(tonic)
 
     return amplitude, nr_peaks, auc
@@ -34,100 +35,88 @@ def compute_engagement(eda):
 
 def _mean_filter(eda):
     """
-    Compute the mean eda signal, using a mean kernel of 10 seconds width
+    Compute the mean eda signal, using a mean kernel of 10 seconds width.
+    The mean of each kernel is the difference of two cumulative sums
 
-    :param eda: list of eda data points
-    :type eda: list of float
+    :param eda: array of eda data points
+    :type eda: np.ndarray
     :return: mean filter of the signal
     :rtype: np.array
     """
-    mean_arr = np.array([])
-    for i in range(MEAN_KERNEL_WIDTH, len(eda) - MEAN_KERNEL_WIDTH):
-        mean = np.mean(eda[i - MEAN_KERNEL_WIDTH: i + MEAN_KERNEL_WIDTH + 1])
-        mean_arr = np.append(mean_arr, mean)
-    return mean_arr
+    kernel = 2 * MEAN_KERNEL_WIDTH + 1
+    if len(eda) < kernel:
+        return np.array([])
+    cumulative = np.concatenate(([0.0], np.cumsum(eda)))
+    return (cumulative[kernel:] - cumulative[:-kernel]) / kernel
 
 
 def _find_peaks(modified_phasic):
     """
-    Find the position of peak start and peak ends on the phasic signal
+    Find the position of peak start and peak ends on the phasic signal.
+
+    A peak starts where the signal crosses above the onset threshold, and ends where it
+    dips below the offset threshold. A start is only counted when we are not already in a peak,
+    and an end only when we are, so of each run of crossings of the same kind only the first counts.
 
-    :param modified_phasic: list of the phasic signal data points
-    :type modified_phasic: list of float
-    :return: two lists with 1 where peaks starts and ends respectively
-    :rtype: (list of int, list of int)
+    :param modified_phasic: array of the phasic signal data points
+    :type modified_phasic: np.ndarray
+    :return: two arrays with the indices where peaks starts and ends respectively
+    :rtype: (np.ndarray, np.ndarray)
     """
-    peak_start = np.zeros(len(modified_phasic))
-    peak_end = np.zeros(len(modified_phasic))
-    rising = False
+    # 1 where the signal crosses above the onset threshold, -1 where it dips below the offset threshold
+    crossings = np.zeros(len(modified_phasic), dtype=np.int8)
+    current = modified_phasic[:-1]
+    following = modified_phasic[1:]
+    crossings[1:][(current < ONSET_THRESHOLD) & (ONSET_THRESHOLD < following)] = 1
+    crossings[1:][(current > OFFSET_THRESHOLD) & (OFFSET_THRESHOLD > following)] = -1
 
     # identify if start is peak
-    if ONSET_THRESHOLD < modified_phasic[0] < modified_phasic[1]:
-        peak_start[0] = 1
-        rising = True
+    if len(modified_phasic) > 1 and ONSET_THRESHOLD < modified_phasic[0] < modified_phasic[1]:
+        crossings[0] = 1
 
-    for i in range(len(modified_phasic) - 1):
-        # peak starts from the point it gets above the onset threshold
-        if modified_phasic[i] < ONSET_THRESHOLD < modified_phasic[i + 1] and not rising:
-            peak_start[i + 1] = 1
-            rising = True
-        # peak ends from the point it dips below the offset threshold
-        elif modified_phasic[i] > OFFSET_THRESHOLD > modified_phasic[i + 1] and rising:
-            peak_end[i + 1] = 1
-            rising = False
+    # Keep the first crossing of each run, before the first crossing we are not in a peak
+    positions = np.flatnonzero(crossings)
+    kinds = crossings[positions]
+    keep = kinds != np.concatenate(([-1], kinds[:-1]))
+    positions, kinds = positions[keep], kinds[keep]
 
-    return peak_start, peak_end
+    return positions[kinds == 1], positions[kinds == -1]
 
 
 def _find_amplitude(peak_start, peak_end, phasic):
     """
     Find the total amplitude of the highest points of each peak
 
-    :param peak_start: where the peaks in the phasic signal starts
-    :type peak_start: list of int
-    :param peak_end: where the peaks in the phasic signal ends
-    :type peak_end: list of int
-    :param phasic: list of the phasic signal data points
-    :type phasic: list of float
+    :param peak_start: indices where the peaks in the phasic signal starts
+    :type peak_start: np.ndarray
+    :param peak_end: indices where the peaks in the phasic signal ends
+    :type peak_end: np.ndarray
+    :param phasic: array of the phasic signal data points
+    :type phasic: np.ndarray
     :return: the amplitude of the phasic signal
     :rtype: float
     """
-    amplitude = 0
-    for i in range(len(phasic)):
-        # if we found a peak start
-        if peak_start[i] == 1:
-            j = i
-            # find the peak end (or end of data points)
-            while j < len(phasic) and peak_end[j] != 1:
-                j += 1
-            # find the highest point of phasic in the range from the start of peak to end of peak
-            amplitude += max(phasic[i:j + 1])
-
-    return amplitude
+    if len(peak_start) == 0:
+        return 0.0
+    # Every peak ends at the following peak end, the last peak may run to the end of the data points
+    ends = np.full(len(peak_start), len(phasic))
+    ends[:len(peak_end)] = peak_end + 1
+    # Segment maxima of [start, end) for every peak, every second reduceat segment is the gap between peaks
+    bounds = np.stack((peak_start, ends), axis=1).ravel()
+    maxima = np.maximum.reduceat(np.append(phasic, -np.inf), bounds)[::2]
+    return float(np.sum(maxima))
 
 
 def _area_under_curve(tonic):
     """
-    Computes the area under the curve of the tonic signal, using trigonometry
+    Computes the area under the curve of the tonic signal, using the trapezoidal rule
 
-    :param tonic: list of the tonic signal
-    :type tonic: list of float
+    :param tonic: array of the tonic signal
+    :type tonic: np.ndarray
     :return: area under the curve of the tonic signal
     :rtype: float
     """
-    auc = 0
-    for i in range(len(tonic) - 1):
-        # first data point
-        y1 = tonic[i]
-        # second datapoint
-        y2 = tonic[i + 1]
-        # change in y
-        dy = y2 - y1
-        # change in x
-        dx = 1 / FQ
-
-        area_square = y1 * dx
-        area_triangle = dy * dx / 2
-        auc += area_square + area_triangle
-
-    return auc
+    if len(tonic) < 2:
+        return 0.0
+    dx = 1 / FQ
+    return float(dx * (np.sum(tonic) - (tonic[0] + tonic[-1]) / 2))
@@ -1,5 +1,10 @@
 import numpy as np
-import statsmodels.api as sm
+from numpy.lib.stride_tricks import sliding_window_view
+
+""" Constants """
+# Number of templates compared at once when counting neighbours for the approximate entropy,
+# which bounds the memory used for long windows
+TEMPLATE_BLOCK = 256
 
 
 def compute_entertainment(hr):
@@ -18,36 +23,92 @@ def compute_entertainment(hr):
     the unpredictability of fluctuations in the HR time series.
 
     :param hr: list of heart rate values
-    :type hr: list of float
+    :type hr: np.ndarray or list of float
     :return: 9 different features as described above
     :rtype: (float, float, float, float, float, float, float, float, float)
     """
-    def ApEn(U, m, r) -> float:
-        """
-        Approximate_entropy. Source:
-        https://en.wikipedia.org/wiki/Approximate_entropy
-        """
-
-        def _maxdist(x_i, x_j):
-            return max([abs(ua - va) for ua, va in zip(x_i, x_j)])
-
-        def _phi(m):
-            x = [[U[j] for j in range(i, i + m - 1 + 1)] for i in range(N - m + 1)]
-            C = [
-                len([1 for x_j in x if _maxdist(x_i, x_j) <= r]) / (N - m + 1.0)
-                for x_i in x
-            ]
-            return (N - m + 1.0) ** (-1) * sum(np.log(C))
-        N = len(U)
-        return abs(_phi(m + 1) - _phi(m))
-
-    hr = np.asarray(hr)
+    hr = np.asarray(hr, dtype=float)
     avg_hr = np.average(hr)
     var_hr = np.var(hr)
     max_hr = np.amax(hr)
     min_hr = np.amin(hr)
     diff = max_hr - min_hr
     p = np.corrcoef(hr, np.arange(len(hr)))
-    p1 = sm.tsa.acf(hr, nlags=1, fft=False)
-    approximate_entropy = ApEn(hr, 2, 3)
+    p1 = _autocorrelation(hr)
+    approximate_entropy = _approximate_entropy(hr, 2, 3)
     return avg_hr, var_hr, max_hr, min_hr, diff, p1[0], p1[1], approximate_entropy, p[0][1]
+
+
+def _autocorrelation(hr):
+    """
+    The autocorrelation of the signal at lag 0 and lag 1, the same as statsmodels' acf(hr, nlags=1)
+
+    :param hr: array of heart rate values
+    :type hr: np.ndarray
+    :return: autocorrelation at lag 0 and lag 1
+    :rtype: (float, float)
+    """
+    deviation = hr - np.mean(hr)
+    variance = np.dot(deviation, deviation)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return variance / variance, np.dot(deviation[:-1], deviation[1:]) / variance
+
+
+def _approximate_entropy(U, m, r):
+    """
+    Approximate_entropy. Source:
+    https://en.wikipedia.org/wiki/Approximate_entropy
+
+    :param U: array of heart rate values
+    :type U: np.ndarray
+    :param m: length of the compared runs of data
+    :type m: int
+    :param r: filtering level, the maximum distance for two runs to be similar
+    :type r: float
+    :rtype: float
+    """
+    return abs(_phi(U, m + 1, r) - _phi(U, m, r))
+
+
+def _phi(U, m, r):
+    """ The average logarithm of the ratio of templates of length m within distance r of each template """
+    templates = sliding_window_view(U, m)
+    return np.mean(np.log(_count_neighbours(templates, r) / len(templates)))
+
+
+def _count_neighbours(templates, r):
+    """
+    Count the templates within distance r (the maximum distance between two elements) of each template.
+
+    The templates are sorted by their first element, so each block of templates is only compared
+    with the templates whose first element can be within distance r, and not with all of them.
+
+    :param templates: array with one template per row
+    :type templates: np.ndarray
+    :param r: the maximum distance for two templates to be similar
+    :type r: float
+    :return: the number of similar templates for each template, including itself
+    :rtype: np.ndarray
+    """
+    order = np.argsort(templates[:, 0], kind="stable")
+    templates = templates[order]
+    first = templates[:, 0]
+    # Search with a slightly larger distance, so rounding never excludes a template that is within r
+    search_distance = r + 1e-9 * (abs(r) + np.max(np.abs(first)))
+
+    counts = np.empty(len(templates), dtype=np.int64)
+    for start in range(0, len(templates), TEMPLATE_BLOCK):
+        block = templates[start:start + TEMPLATE_BLOCK]
+        low = np.searchsorted(first, block[0, 0] - search_distance, side="left")
+        high = np.searchsorted(first, block[-1, 0] + search_distance, side="right")
+        candidates = templates[low:high]
+
+        similar = np.abs(block[:, np.newaxis, 0] - candidates[np.newaxis, :, 0]) <= r
+        for k in range(1, templates.shape[1]):
+            similar &= np.abs(block[:, np.newaxis, k] - candidates[np.newaxis, :, k]) <= r
+        counts[start:start + TEMPLATE_BLOCK] = np.count_nonzero(similar, axis=1)
+
+    # Put the counts back in the original order of the templates
+    result = np.empty_like(counts)
+    result[order] = counts
+    return result
@@ -0,0 +1,27 @@
+import numpy as np
+
+""" Constants """
+FQ = 32  # frequency of data points, 32 per second
+G = 64  # the accelerometer measures in 1/64 g
+ARTIFACT_THRESHOLD = 0.1  # change in acceleration in g between two samples that is classified as a motion artifact
+
+
+def compute_motion(acc):
+    """
+    Compute how much the wristband moves, used to detect motion artifacts in the EDA and BVP signals.
+
+    The magnitude of the acceleration is computed for every sample, and the features are based on
+    the change in magnitude between subsequent samples, which removes the constant effect of gravity.
+
+    :param acc: the x, y and z accelerometer values of each data point
+    :type acc: np.ndarray of shape (n, 3) or list of (float, float, float)
+    :return: activity - mean absolute change in acceleration (g per sample),
+    and the ratio of samples classified as motion artifacts
+    :rtype: (float, float)
+    """
+    magnitude = np.sqrt(np.square(np.asarray(acc, dtype=float)).sum(axis=1)) / G
+    change = np.abs(np.diff(magnitude))
+
+    activity = max(float(change.mean()), 0.001)
+    artifact_ratio = max(np.count_nonzero(change > ARTIFACT_THRESHOLD) / len(change), 0.01)
+    return activity, artifact_ratio
@@ -0,0 +1,35 @@
+import numpy as np
+from scipy.signal import find_peaks
+
+""" Constants """
+FQ = 64  # frequency of data points, 64 per second
+MAX_HR = 180  # highest heart rate in beats per minute that the peak detection can find
+MIN_PEAK_DISTANCE = int(FQ * 60 / MAX_HR)  # the minimum number of data points between two pulse peaks
+MIN_PROMINENCE = 0.3  # the minimum prominence of a pulse peak, relative to the range of the signal in the window
+
+
+def compute_pulse(bvp):
+    """
+    Compute the heart rate and pulse amplitude from the blood volume pulse (BVP) signal
+
+    Each pulse is found as a peak in the signal, and the amplitude of a pulse is its prominence,
+    i.e. the height of the peak above the surrounding troughs. Peaks with a low prominence,
+    like noise and the dicrotic notch, are not counted as pulses.
+
+    :param bvp: list of bvp data points
+    :type bvp: np.ndarray or list of float
+    :return: heart rate in beats per minute and the average pulse amplitude
+    :rtype: (float, float)
+    """
+    bvp = np.asarray(bvp, dtype=float)
+    peaks, properties = find_peaks(bvp, distance=MIN_PEAK_DISTANCE, prominence=MIN_PROMINENCE * np.ptp(bvp))
+
+    if len(peaks) < 2:
+        # Not enough pulses to measure the time between them, estimate from the window duration instead
+        heart_rate = 60 * FQ * len(peaks) / len(bvp)
+        amplitude = float(properties["prominences"].sum())
+    else:
+        heart_rate = 60 * FQ * (len(peaks) - 1) / (peaks[-1] - peaks[0])
+        amplitude = float(properties["prominences"].mean())
+
+    return max(heart_rate, 1.0), max(amplitude, 0.01)
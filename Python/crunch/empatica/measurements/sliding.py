@@ -0,0 +1,57 @@
+import numpy as np
+
+
+class SlidingSum:
+    """
+    Running sum over a window of a value computed from each pair of subsequent data points.
+
+    The window moves window_step data points at a time, so only the contributions of the
+    differences that enter the window are computed and added, and the contributions of the
+    differences that leave the window are subtracted, i.e. each update costs O(window_step)
+    instead of O(window_length). The sum is recomputed from the whole window every
+    resync_interval updates, so floating point errors do not accumulate.
+    """
+
+    def __init__(self, window_step, contribution, resync_interval=100):
+        """
+        :param window_step: how many data points the window moves between two calls
+        :type window_step: int
+        :param contribution: computes the contribution of each difference between subsequent data points
+        :type contribution: (np.ndarray) -> np.ndarray
+        :param resync_interval: number of updates between each recomputation of the whole sum
+        :type resync_interval: int
+        """
+        self.window_step = window_step
+        self.contribution = contribution
+        self.resync_interval = resync_interval
+        # The contribution of each difference in the window, oldest first from index self.oldest
+        self.contributions = None
+        self.oldest = 0
+        self.total = 0.0
+        self.updates = 0
+
+    def __call__(self, window):
+        """
+        Update the sum with the latest window. Must be called with every window, window_step data points apart
+
+        :param window: the data points in the window
+        :type window: np.ndarray
+        :return: the sum of the contributions of all differences in the window
+        :rtype: float
+        """
+        differences = len(window) - 1
+        if (self.contributions is None or len(self.contributions) != differences
+                or self.window_step >= differences or self.updates >= self.resync_interval):
+            self.contributions = self.contribution(np.diff(window))
+            self.oldest = 0
+            self.total = float(np.sum(self.contributions))
+            self.updates = 0
+            return self.total
+
+        entering = self.contribution(np.diff(window[-(self.window_step + 1):]))
+        leaving = (self.oldest + np.arange(self.window_step)) % differences
+        self.total += float(np.sum(entering) - np.sum(self.contributions[leaving]))
+        self.contributions[leaving] = entering
+        self.oldest = (self.oldest + self.window_step) % differences
+        self.updates += 1
+        return self.total
@@ -1,5 +1,43 @@
+from functools import lru_cache
+
 import numpy as np
 
+""" Constants """
+# Seconds between two temperature data points, the wristband samples the temperature at 4 Hz
+X_STEP = 0.25
+
+
+@lru_cache(maxsize=None)
+def _x_moments(window_length):
+    """
+    The moments of the x-axis of a window, which only depend on the window length
+
+    :param window_length: number of temperatures in the window
+    :type window_length: int
+    :return: the index of each temperature, their mean, and the scaled sum of squared deviations of the x-axis
+    :rtype: np.ndarray, float, float
+    """
+    index = np.arange(window_length, dtype=float)
+    index.flags.writeable = False
+    mean_index = (window_length - 1) / 2
+    return index, mean_index, X_STEP * float(np.sum((index - mean_index) ** 2))
+
+
+@lru_cache(maxsize=None)
+def _slope_weights(window_length):
+    """
+    Least squares slope of a window as a weighted sum of its temperatures
+
+    :param window_length: number of temperatures in the window
+    :type window_length: int
+    :return: the weight of each temperature in the slope
+    :rtype: np.ndarray
+    """
+    index, mean_index, x_deviation = _x_moments(window_length)
+    weights = (index - mean_index) / x_deviation
+    weights.flags.writeable = False
+    return weights
+
 
 def compute_stress(temps_list):
     """
@@ -7,6 +45,83 @@ def compute_stress(temps_list):
     :param temps_list: list of temperatures
     :return: returns the overall change in temperature in the list
     """
-    slope = np.polyfit([0.25 * i for i in range(len(temps_list))], temps_list, 1)[0]
-    negative_slope = np.negative(slope)
-    return float(negative_slope)
+    slope = np.dot(_slope_weights(len(temps_list)), temps_list)
+    return float(-slope)
+
+
+def compute_stress_series(temps, window_length, window_step=1):
+    """
+    Computes the stress of every window of a long series of temperatures at once, for offline reprocessing
+
+    :param temps: the temperatures
+    :type temps: np.ndarray or list of float
+    :param window_length: number of temperatures in each window
+    :type window_length: int
+    :param window_step: number of temperatures between the start of two windows
+    :type window_step: int
+    :return: the stress of each window, the same as compute_stress of the window
+    :rtype: np.ndarray
+    """
+    slopes = np.convolve(np.asarray(temps, dtype=float), _slope_weights(window_length)[::-1], "valid")
+    return -slopes[::window_step]
+
+
+class SlidingStress:
+    """
+    Streaming version of compute_stress for a handler whose window moves window_step data points at a time.
+
+    Keeps the sum of the temperatures and the sum of each temperature times its index in the window,
+    and updates them with the temperatures that enter and leave the window, so the slope costs O(1)
+    per data point. The sums are recomputed from the whole window every resync_interval updates,
+    so floating point errors do not accumulate.
+    """
+
+    def __init__(self, window_step, resync_interval=100):
+        """
+        :param window_step: how many data points the window moves between two calls
+        :type window_step: int
+        :param resync_interval: number of updates between each recomputation of the sums
+        :type resync_interval: int
+        """
+        self.window_step = window_step
+        self.resync_interval = resync_interval
+        # The temperatures in the window, oldest first from index self.oldest
+        self.temps = None
+        self.oldest = 0
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self.updates = 0
+
+    def __call__(self, temps):
+        """
+        :param temps: the temperatures in the window, must be called with every window of the handler
+        :type temps: np.ndarray
+        :return: returns the overall change in temperature in the window
+        :rtype: float
+        """
+        temps = np.asarray(temps, dtype=float)
+        window_length = len(temps)
+        index, mean_index, x_deviation = _x_moments(window_length)
+        step = self.window_step
+        if (self.temps is None or len(self.temps) != window_length
+                or step >= window_length or self.updates >= self.resync_interval):
+            self.temps = temps.copy()
+            self.oldest = 0
+            self.sum_y = float(np.sum(temps))
+            self.sum_xy = float(np.dot(index, temps))
+            self.updates = 0
+        else:
+            leaving_index = (self.oldest + np.arange(step)) % window_length
+            leaving = self.temps[leaving_index]
+            entering = temps[-step:]
+            leaving_sum = float(np.sum(leaving))
+            # The remaining temperatures move step places towards the start of the window
+            self.sum_xy += (float(np.dot(index[-step:], entering)) - float(np.dot(index[:step], leaving))
+                            - step * (self.sum_y - leaving_sum))
+            self.sum_y += float(np.sum(entering)) - leaving_sum
+            self.temps[leaving_index] = entering
+            self.oldest = (self.oldest + step) % window_length
+            self.updates += 1
+
+        slope = (self.sum_xy - mean_index * self.sum_y) / x_deviation
+        return float(-slope)
@@ -0,0 +1,78 @@
+def _parse_value(fields):
+    """ Parse the single value of a sample line, accepting both decimal points and decimal commas """
+    return float(fields[2].replace(b",", b"."))
+
+
+def _parse_acc(fields):
+    """ Parse the three axes of an accelerometer sample line """
+    return float(fields[2]), float(fields[3]), float(fields[4])
+
+
+class StreamParser:
+    """
+    Incremental parser for the byte stream sent by the E4 streaming server.
+
+    Data from the server arrives as lines on the form "E4_Gsr <timestamp> <value>", and a
+    line can be split across two recv calls. The parser keeps the incomplete tail of each
+    chunk until the rest of the line arrives, so no sample is lost or misparsed, and each
+    complete line is split exactly once.
+
+    Sample lines are routed to a stream name (the keys used by EmpaticaAPI.subscribers)
+    through the dispatch table, and accelerometer samples keep all three axes as an (x, y, z) tuple.
+    Response and status lines from the server (e.g. "R device_subscribe gsr OK"
+    or "R connection lost to device") are returned separately as messages.
+    """
+    dispatch = {
+        b"E4_Gsr": ("EDA", _parse_value),
+        b"E4_Temperature": ("TEMP", _parse_value),
+        b"E4_Hr": ("HR", _parse_value),
+        b"E4_Ibi": ("IBI", _parse_value),
+        b"E4_Bvp": ("BVP", _parse_value),
+        b"E4_Acc": ("ACC", _parse_acc),
+    }
+
+    def __init__(self, dispatch=None):
+        """
+        :param dispatch: maps the stream name sent by the server to (subscriber name, parse function)
+        :type dispatch: dict of bytes -> (str, (list of bytes) -> any)
+        """
+        if dispatch is not None:
+            self.dispatch = dispatch
+        self.remainder = b""
+
+    def feed(self, chunk):
+        """
+        Parse a chunk of bytes received from the socket
+
+        :param chunk: the bytes returned by a single recv call
+        :type chunk: bytes
+        :return: the parsed samples grouped by subscriber name, and the server messages in the chunk
+        :rtype: (dict of str -> list, list of str)
+        """
+        lines = (self.remainder + chunk).split(b"\n")
+        # The last piece is either empty or an incomplete line, keep it for the next chunk
+        self.remainder = lines.pop()
+
+        samples = {}
+        messages = []
+        dispatch = self.dispatch
+        for line in lines:
+            fields = line.split()
+            if not fields:
+                continue
+            route = dispatch.get(fields[0])
+            if route is not None:
+                name, parse = route
+                try:
+                    value = parse(fields)
+                except (IndexError, ValueError):
+                    continue
+                values = samples.get(name)
+                if values is None:
+                    samples[name] = [value]
+                else:
+                    values.append(value)
+            elif not fields[0].startswith(b"E4_"):
+                messages.append(line.decode("utf-8", "replace").strip())
+
+        return samples, messages
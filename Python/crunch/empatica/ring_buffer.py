@@ -0,0 +1,75 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Preallocated, contiguous float64 buffer that holds the latest window_length data points.
+
+    Data points are written one after another into an array with room for several windows,
+    so the current window is always a contiguous slice of the array and can be handed to the
+    measurement functions as a view, without any copy. Only when the end of the array is reached,
+    the last window is copied to the start of the array and writing continues from there.
+    """
+
+    def __init__(self, window_length, sample_shape=(), capacity=None):
+        """
+        :param window_length: number of data points in a window
+        :type window_length: int
+        :param sample_shape: shape of a single data point, e.g. (3,) for the three axes of the accelerometer
+        :type sample_shape: tuple of int
+        :param capacity: number of data points the array has room for before it wraps, at least 2 * window_length
+        :type capacity: int
+        """
+        self.window_length = window_length
+        capacity = max(capacity or 8 * window_length, 2 * window_length)
+        self.data = np.empty((capacity, *sample_shape), dtype=np.float64)
+        self.end = 0
+        self.size = 0
+
+    def __len__(self):
+        """ Number of data points in the current window """
+        return self.size
+
+    def append(self, datapoint):
+        """ Add a single data point """
+        if self.end == len(self.data):
+            self._wrap()
+        self.data[self.end] = datapoint
+        self.end += 1
+        self.size = min(self.size + 1, self.window_length)
+
+    def extend(self, datapoints):
+        """
+        Add several data points at once
+
+        :param datapoints: the data points, with the sample shape of the buffer
+        :type datapoints: np.ndarray
+        """
+        count = len(datapoints)
+        if count >= self.window_length:
+            # The new data points fill a whole window on their own
+            self.data[:self.window_length] = datapoints[-self.window_length:]
+            self.end = self.size = self.window_length
+            return
+
+        if self.end + count > len(self.data):
+            self._wrap()
+        self.data[self.end:self.end + count] = datapoints
+        self.end += count
+        self.size = min(self.size + count, self.window_length)
+
+    def window(self):
+        """
+        The current window as a read-only view into the buffer. The view is only valid until
+        the next data points are added, so it must be copied if it is kept.
+
+        :rtype: np.ndarray
+        """
+        view = self.data[self.end - self.size:self.end]
+        view.flags.writeable = False
+        return view
+
+    def _wrap(self):
+        """ Move the current window to the start of the array to make room for new data points """
+        self.data[:self.size] = self.data[self.end - self.size:self.end]
+        self.end = self.size
@@ -0,0 +1,70 @@
+import numpy as np
+
+from crunch.empatica.ring_buffer import RingBuffer
+
+
+class WindowStore:
+    """
+    Stores the data of one raw data stream once, for all handlers that subscribe to it.
+
+    Each handler registers a window (window_length, window_step) on the store. All windows
+    are views into one shared ring buffer that is as long as the longest window, and handlers
+    with identical windows get the very same view, so the memory and copy cost depend on the
+    number of streams instead of the number of handlers.
+    """
+
+    def __init__(self):
+        self.data_buffer = None
+        self.data_counter = 0
+        # The handlers of each distinct window, keyed by (window_length, window_step)
+        self.windows = {}
+
+    @property
+    def handlers(self):
+        """ All handlers that get windows from the store """
+        return [handler for handlers in self.windows.values() for handler in handlers]
+
+    def add_handler(self, handler):
+        """
+        Register the window of a handler on the store
+
+        :param handler: a handler with window_length and window_step attributes and an add_window method
+        :type handler: DataHandler
+        """
+        self.windows.setdefault((handler.window_length, handler.window_step), []).append(handler)
+        if self.data_buffer is not None and handler.window_length > self.data_buffer.window_length:
+            # Move the data we already have to a buffer that has room for the longer window
+            window = self.data_buffer.window()
+            self.data_buffer = RingBuffer(handler.window_length, window.shape[1:])
+            self.data_buffer.extend(window)
+
+    def add_data_points(self, datapoints):
+        """
+        Add a batch of data points, and hand every window the batch completes to its handlers,
+        in the same order as if the data points were added one by one
+
+        :param datapoints: the data points received in one chunk from the api
+        :type datapoints: np.ndarray or list of float
+        """
+        if not self.windows:
+            return
+        datapoints = np.asarray(datapoints, dtype=np.float64)
+        if self.data_buffer is None:
+            window_length = max(length for length, _ in self.windows)
+            self.data_buffer = RingBuffer(window_length, datapoints.shape[1:])
+
+        steps = {step for _, step in self.windows}
+        position = 0
+        total = len(datapoints)
+        while position < total:
+            # Add data points up to the next point where a window is completed
+            end = min(position + min(step - self.data_counter % step for step in steps), total)
+            self.data_buffer.extend(datapoints[position:end])
+            self.data_counter += end - position
+            position = end
+
+            for (window_length, window_step), handlers in self.windows.items():
+                if self.data_counter % window_step == 0 and len(self.data_buffer) >= window_length:
+                    window = self.data_buffer.window()[-window_length:]
+                    for handler in handlers:
+                        handler.add_window(window, self.data_counter)
@@ -3,10 +3,14 @@ from crunch.eyetracker.handler import DataHandler
 from crunch.eyetracker.measurements import (
     compute_cognitive_load,
 )
+from crunch.transport import close_transport, set_transport
+from crunch.writer import close_writer
 
 
-def start_eyetracker(api=EyetrackerAPI):
+def start_eyetracker(api=EyetrackerAPI, transport=None):
     """Defines the callback function, try to connect to eye tracker, create EyetrackerAPI and add handlers to api"""
+    # Send the measurements to the websocket process, if given
+    set_transport(transport)
 
     # Instantiate the api
     api = api()
@@ -23,4 +27,9 @@ def start_eyetracker(api=EyetrackerAPI):
     api.add_subscriber(cognitive_load_handler, "gaze")
 
     # start up the api
-    api.connect()
+    try:
+        api.connect()
+    finally:
+        # Processes started by multiprocessing exit without running atexit handlers
+        close_writer()
+        close_transport()
@@ -1,14 +1,103 @@
 import warnings
 import numpy as np
+from scipy.linalg import solve_discrete_lyapunov
 from statsmodels.tsa.arima.model import ARIMA
 
+from crunch.forecasting.order_selection import OrderSelector, fit_arma_aic
+
 
 warnings.filterwarnings("ignore")
 
 
+class ARMAFilter:
+    """
+    Kalman filter of a fitted ARMA model with fixed parameters.
+
+    Filtering a window of observations gives the same forecast and residuals as applying the fitted
+    parameters to the window with statsmodels, without the overhead of creating a model and its results.
+    """
+
+    def __init__(self, model_fit):
+        """
+        Parameters:
+        - model_fit (ARIMAResults): The fitted model.
+        """
+        model = model_fit.model
+        model.update(model_fit.params)
+        ssm = model.ssm
+        self.design = ssm["design"][0].copy()
+        # The constant is part of the observation intercept, which is the same for every observation
+        self.obs_intercept = float(ssm["obs_intercept"][0, 0])
+        self.obs_cov = float(ssm["obs_cov"][0, 0])
+        self.transition = ssm["transition"].copy()
+        self.state_intercept = ssm["state_intercept"].copy()
+        selection = ssm["selection"]
+        self.state_noise_cov = selection @ ssm["state_cov"] @ selection.T
+        self.sigma2 = float(ssm["state_cov"][0, 0])
+
+        # The filter starts from the stationary distribution of the state
+        identity = np.eye(len(self.transition))
+        self.initial_state = np.linalg.solve(identity - self.transition, self.state_intercept)
+        self.initial_state_cov = solve_discrete_lyapunov(self.transition, self.state_noise_cov)
+
+    def filter(self, history, steps):
+        """
+        Filter a window of observations, and forecast the observations after it.
+
+        Parameters:
+        - history (np.array): The observations.
+        - steps (int): The number of observations to forecast.
+
+        Returns:
+        - tuple: The forecast and the one step ahead forecast errors (residuals) of the observations.
+        """
+        state = self.initial_state
+        state_cov = self.initial_state_cov
+        residuals = np.empty(len(history))
+        for i, observation in enumerate(history):
+            residuals[i] = observation - self.design @ state - self.obs_intercept
+            cov_design = state_cov @ self.design
+            gain = self.transition @ cov_design / (self.design @ cov_design + self.obs_cov)
+            state = self.transition @ state + self.state_intercept + gain * residuals[i]
+            state_cov = (
+                self.transition @ state_cov @ self.transition.T
+                - np.outer(gain, self.transition @ cov_design)
+                + self.state_noise_cov
+            )
+
+        forecast = np.empty(steps)
+        for i in range(steps):
+            forecast[i] = self.design @ state + self.obs_intercept
+            state = self.transition @ state + self.state_intercept
+        return forecast, residuals
+
+
 class ARMAClass:
-    def __init__(self, history, p=None, q=None, forecast_length=10):
+    def __init__(
+        self,
+        history,
+        p=None,
+        q=None,
+        forecast_length=10,
+        refit_interval=1,
+        drift_threshold=None,
+        order_selector=None,
+    ):
+        """
+        Parameters:
+        - history (np.array): The historical values used to fit the model.
+        - p, q (int): The order of the model, estimated from the history if None.
+        - forecast_length (int): How far into the future to forecast.
+        - refit_interval (int): The number of observations between full refits of the model. In between,
+          the parameters stay fixed and every window is only filtered. 1 refits on every observation.
+        - drift_threshold (float): Refit early when the mean squared residual of a window is more than
+          drift_threshold times larger or smaller than the innovation variance of the model. None never refits early.
+        - order_selector (OrderSelector): Selects the order of the model, defaults to a search of its own.
+        """
         self.forecast_length = forecast_length
+        self.order_selector = order_selector or OrderSelector(fit_arma_aic, "ARMA")
+        self.refit_interval = refit_interval
+        self.drift_threshold = drift_threshold
 
         # If p or q is None, estimate the order of the model
         if p is None or q is None:
@@ -19,6 +108,9 @@ class ARMAClass:
 
         self.model = ARIMA(history, order=(self.p, 0, self.q))
         self.model_fit = self.model.fit()
+        self.filter = ARMAFilter(self.model_fit)
+        self.residuals = self.model_fit.resid
+        self.observations_since_refit = 0
         # Counter used to re-estimate p and q every 41st iteration
         self.counter = 0
 
@@ -29,22 +121,7 @@ class ARMAClass:
         Returns:
         - tuple: Best order (p, q) based on AIC.
         """
-        best_aic = np.inf
-        best_order = None
-
-        for p in range(2, 6):
-            for q in range(2, 6):
-                try:
-                    model = ARIMA(history, order=(p, 0, q))
-                    model_fit = model.fit()
-                    aic = model_fit.aic
-                    if aic < best_aic:
-                        best_aic = aic
-                        best_order = (p, q)
-                except:
-                    continue
-        print(f"Best order ARMA: {best_order}")
-        return best_order
+        return self.order_selector.select(history)
 
     def update_and_predict(self, history):
         """
@@ -59,14 +136,68 @@ class ARMAClass:
 
         if self.counter == 41:
             self.counter = 0
-            self.estimate_order(history)
+            # The order is searched in the background, and the current order is used until the search is finished
+            self.order_selector.start(history)
         self.counter += 1
+        self.observations_since_refit += 1
+        order = self.order_selector.result()
+        if order is not None and order != (self.p, self.q):
+            # Apply the new order, p and q together, and refit the model with it
+            self.p, self.q = order
+            return self.refit(history)
+        if self.observations_since_refit >= self.refit_interval:
+            return self.refit(history)
+
+        try:
+            forecast, residuals = self.filter.filter(history, self.forecast_length)
+        except (np.linalg.LinAlgError, ValueError):
+            return self.refit(history)
+        if self.has_drifted(residuals):
+            return self.refit(history)
+        self.residuals = residuals
+        return forecast
+
+    def refit(self, history):
+        """
+        Fit the model to the history, starting from the current parameters, and forecast.
+
+        Parameters:
+        - history (np.list): The historical values used to fit the model and make forecast.
+
+        Returns:
+        - forecast: The array of forecasted cognitive load values.
+        """
+        self.observations_since_refit = 0
         model = ARIMA(history, order=(self.p, 0, self.q))
-        self.model_fit = model.fit()
+        model_fit = None
+        if self.model_fit.model.order == model.order:
+            try:
+                model_fit = model.fit(start_params=self.model_fit.params)
+            except (np.linalg.LinAlgError, ValueError):
+                # The current parameters are no good start for this history
+                pass
+        self.model_fit = model_fit if model_fit is not None else model.fit()
+        self.filter = ARMAFilter(self.model_fit)
+        self.residuals = self.model_fit.resid
 
         forecast = self.model_fit.forecast(steps=self.forecast_length)
         return forecast
 
+    def has_drifted(self, residuals):
+        """
+        Whether the residuals no longer match the innovation variance of the fitted model.
+
+        Parameters:
+        - residuals (np.array): The residuals of the newest window.
+
+        Returns:
+        - bool: True if the model should be refitted.
+        """
+        if self.drift_threshold is None:
+            return False
+        ratio = np.mean(residuals**2) / self.filter.sigma2
+        return ratio > self.drift_threshold or ratio < 1 / self.drift_threshold
+
     def get_residuals(self):
         """
         Retrieve the residuals from the fitted ARIMA model.
@@ -74,6 +205,6 @@ class ARMAClass:
         Returns:
         --------
         np.ndarray
-            The residuals from the fitted model.
+            The residuals of the newest window.
         """
-        return self.model_fit.resid
+        return self.residuals
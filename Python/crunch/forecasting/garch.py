@@ -1,20 +1,52 @@
+import warnings
+from collections import deque
+from concurrent.futures import BrokenExecutor
+
 import numpy as np
 from arch import arch_model
 
+from crunch.forecasting.order_selection import (OrderSelector, discard_executor, fit_garch_aic, get_background,
+                                                get_executor)
+
+
+def fit_garch(history, order):
+    """
+    Fit a GARCH model of an order to the history.
+
+    Returns:
+    --------
+    - tuple: The fitted parameters mu, omega, alpha (p values) and beta (q values), or None if it could not be fitted.
+    """
+    warnings.filterwarnings("ignore")
+    try:
+        model = arch_model(history, vol="Garch", p=order[0], q=order[1], rescale=False)
+        params = model.fit(disp="off").params.to_numpy()
+    except Exception:
+        return None
+    return params[0], params[1], params[2:2 + order[0]], params[2 + order[0]:]
+
 
 class GARCHClass:
     """
     GARCH Model for standard deviation forecasting.
 
+    The model is fitted once, and the conditional variance is updated with every new residual with the fitted
+    parameters, which only takes O(p + q). The parameters are fitted again in the background
+    every [refit_interval] observations, while the current parameters keep serving forecasts.
+
     Attributes:
     -----------
     p : int
         Lag order for the autoregressive component.
     q : int
         Lag order for the moving average component.
+    mu, omega, alpha, beta :
+        The fitted parameters of the mean and the conditional variance.
+    variance : float
+        The conditional variance of the next residual.
     """
 
-    def __init__(self, history, p=None, q=None, forecast_length=10):
+    def __init__(self, history, p=None, q=None, forecast_length=10, order_selector=None, refit_interval=1):
         """
         Initialize the GARCH model.
 
@@ -22,8 +54,14 @@ class GARCHClass:
         -----------
         residuals : np.ndarray
             residuals from the ARMA model.
+        order_selector : OrderSelector
+            selects the order of the model, defaults to a search of its own.
+        refit_interval : int
+            number of observations between the background refits of the parameters.
         """
         self.forecast_length = forecast_length
+        self.order_selector = order_selector or OrderSelector(fit_garch_aic, "GARCH")
+        self.refit_interval = refit_interval
 
         # If p or q is None, estimate the order of the model
         if p is None or q is None:
@@ -32,6 +70,12 @@ class GARCHClass:
             self.p = p
             self.q = q
 
+        params = fit_garch(history, (self.p, self.q))
+        if params is None:
+            raise ValueError(f"Could not fit a GARCH model of order {(self.p, self.q)}")
+        self.set_params(params, history)
+        self._refit = None
+        self.observations_since_refit = 0
         # Counter used to re-estimate p and q every 41st iteration
         self.counter = 0
 
@@ -44,18 +88,83 @@ class GARCHClass:
         --------
         - tuple: Best order (p, q) based on AIC.
         """
-        best_aic = np.inf
-        best_order = None
-
-        for p in range(2, 6):
-            for q in range(2, 6):
-                model = arch_model(history, vol="Garch", p=p, q=q, rescale=False)
-                model_fit = model.fit(disp="off")
-                if model_fit.aic < best_aic:
-                    best_aic = model_fit.aic
-                    best_order = (p, q)
-        print(f"Best order GARCH: {best_order}")
-        return best_order
+        return self.order_selector.select(history)
+
+    def set_params(self, params, history):
+        """
+        Use new parameters, and filter the history with them to get the conditional variance.
+
+        Parameters:
+        -----------
+        params : tuple
+            mu, omega, alpha and beta, as returned by fit_garch.
+        history : np.ndarray
+            residuals from the ARMA model.
+        """
+        self.mu, self.omega, alpha, beta = params
+        self.alpha = np.asarray(alpha, dtype=float)
+        self.beta = np.asarray(beta, dtype=float)
+
+        # The lags before the first residual are the backcast of the demeaned residuals, like arch does
+        history = np.asarray(history, dtype=float)
+        demeaned = history - np.mean(history)
+        weights = 0.94 ** np.arange(min(75, len(history)))
+        backcast = np.sum(demeaned[: len(weights)] ** 2 * weights) / np.sum(weights)
+        residuals = history - self.mu
+        # The newest squared residuals and variances come first
+        self.squared_residuals = deque([backcast] * len(self.alpha), maxlen=len(self.alpha))
+        self.variances = deque([backcast] * len(self.beta), maxlen=len(self.beta))
+        self.variance = self.omega + (np.sum(self.alpha) + np.sum(self.beta)) * backcast
+        for residual in residuals:
+            self.update_variance(residual)
+
+    def update_variance(self, residual):
+        """
+        Add a residual, and compute the conditional variance of the next residual in O(p + q).
+
+        Parameters:
+        -----------
+        residual : float
+            the new residual, minus mu.
+        """
+        self.squared_residuals.appendleft(residual**2)
+        self.variances.appendleft(self.variance)
+        self.variance = (
+            self.omega
+            + np.dot(self.alpha, self.squared_residuals)
+            + np.dot(self.beta, self.variances)
+        )
+
+    def start_refit(self, history):
+        """ Fit the parameters to the history in the background, unless a refit is running already. """
+        if self._refit is None:
+            history = np.array(history, dtype=float)
+            executor = get_executor() or get_background()
+            try:
+                self._refit = executor.submit(fit_garch, history, (self.p, self.q))
+            except BrokenExecutor:
+                # The process pool stopped working, so it is replaced, and this refit runs on the background thread
+                discard_executor(executor)
+                self._refit = get_background().submit(fit_garch, history, (self.p, self.q))
+            self.observations_since_refit = 0
+
+    def _refit_result(self):
+        """
+        The parameters of the finished refit.
+
+        Returns:
+        - tuple: The parameters, or None if the refit failed and the current parameters are kept.
+        """
+        refit, self._refit = self._refit, None
+        try:
+            params = refit.result()
+        except Exception as error:
+            # E.g. the process pool broke while the parameters were fitted
+            print(f"Could not refit GARCH: {error!r}")
+            return None
+        if params is None:
+            print(f"Could not refit GARCH of order {(self.p, self.q)}")
+        return params
 
     def update_and_predict(self, history):
         """
@@ -69,10 +178,26 @@ class GARCHClass:
         """
         if self.counter == 41:
             self.counter = 0
-            self.estimate_order(history)
+            # The order is searched in the background, and the current order is used until the search is finished
+            self.order_selector.start(history)
         self.counter += 1
-        model = arch_model(history, vol="Garch", p=self.p, q=self.q, rescale=False)
-        model_fit = model.fit(disp="off")
+        order = self.order_selector.result()
+        if order is not None and order != (self.p, self.q):
+            self.p, self.q = order
+            self.start_refit(history)
+        self.observations_since_refit += 1
+        if self.observations_since_refit >= self.refit_interval:
+            self.start_refit(history)
+
+        params = self._refit_result() if self._refit is not None and self._refit.done() else None
+        if params is not None:
+            # Apply the new parameters at once, and filter the newest residuals with them
+            self.set_params(params, history)
+            if (len(self.alpha), len(self.beta)) != (self.p, self.q):
+                # The order changed while the parameters were fitted
+                self.start_refit(history)
+        else:
+            self.update_variance(history[-1] - self.mu)
 
-        forecasts = model_fit.forecast(horizon=self.forecast_length)
-        return forecasts.mean["h.01"].iloc[-1]
+        # The mean forecast of the constant mean model is the same for every horizon, so only h.01 is needed
+        return float(self.mu)
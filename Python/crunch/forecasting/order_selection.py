@@ -0,0 +1,229 @@
+import warnings
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import crunch.util as util
+
+""" Constants """
+# The candidate orders (p, q) of the ARMA and GARCH models
+ORDERS = [(p, q) for p in range(2, 6) for q in range(2, 6)]
+# Max number of fitted candidates remembered by an OrderSelector
+CACHE_SIZE = 256
+
+
+def fit_arma_aic(history, order):
+    """
+    Fit an ARMA model of an order to the history.
+
+    Returns:
+    - float: The AIC of the fitted model, or inf if it could not be fitted.
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    warnings.filterwarnings("ignore")
+    try:
+        return ARIMA(history, order=(order[0], 0, order[1])).fit().aic
+    except Exception:
+        return np.inf
+
+
+def fit_garch_aic(history, order):
+    """
+    Fit a GARCH model of an order to the history.
+
+    Returns:
+    - float: The AIC of the fitted model, or inf if it could not be fitted.
+    """
+    from arch import arch_model
+
+    warnings.filterwarnings("ignore")
+    try:
+        return arch_model(history, vol="Garch", p=order[0], q=order[1], rescale=False).fit(disp="off").aic
+    except Exception:
+        return np.inf
+
+
+# The process pool that fits the candidates of all order selectors of this process
+_executor = None
+# Whether this process may start the pool
+_executor_enabled = True
+# The thread that runs the order searches and refits in the background
+_background = None
+
+
+def get_executor():
+    """
+    The process pool that fits the candidates, as configured in the config file.
+
+    The pool is started lazily, when other threads of the process may be running already,
+    so the workers are started with util.process_context().
+
+    Returns:
+    - ProcessPoolExecutor: The pool, or None if the candidates are fitted one after another.
+    """
+    global _executor
+    workers = int(util.config("forecasting", "order_selection_workers"))
+    if _executor is None and workers > 0 and _executor_enabled:
+        _executor = ProcessPoolExecutor(workers, mp_context=util.process_context())
+    return _executor
+
+
+def discard_executor(executor):
+    """
+    Stop using a process pool that is broken, e.g. because a worker was killed,
+    so get_executor() starts a new pool the next time.
+    """
+    global _executor
+    if executor is _executor:
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def disable_executor():
+    """
+    Fit the candidates of this process one after another. Used in pool workers,
+    which would wait forever for a pool of their own when they exit.
+    """
+    global _executor_enabled
+    _executor_enabled = False
+
+
+def get_background():
+    """
+    The thread that runs the order searches and refits of this process in the background.
+
+    Returns:
+    - ThreadPoolExecutor: The thread.
+    """
+    global _background
+    if _background is None:
+        _background = ThreadPoolExecutor(1, thread_name_prefix="order-selection")
+    return _background
+
+
+class OrderSelector:
+    """
+    Selects the order (p, q) of a model with the lowest AIC, Akaike information criterion
+    https://en.wikipedia.org/wiki/Akaike_information_criterion
+
+    The candidates are fitted in a process pool, a level of candidates with the same number of lags (p + q)
+    at a time. The search starts with the previous best order and the levels closest to it, and stops early
+    when [patience] levels in a row do not lower the best AIC, as the penalty of the extra lags outgrows
+    the gain in likelihood. The AIC of every fitted candidate is cached, so a window is never fitted twice.
+
+    A search can run in the background with start(), while the model keeps forecasting with its current order,
+    and result() returns the new order once the search is finished.
+    """
+
+    def __init__(self, fit, name, patience=None, executor=None):
+        """
+        Parameters:
+        - fit (function): Fits a candidate, fit(history, order) returns the AIC. Must be picklable.
+        - name (str): The name of the model, e.g. "ARMA".
+        - patience (int): The number of levels without a lower AIC before the search stops. Defaults to the config file.
+        - executor (concurrent.futures.Executor): Fits the candidates, defaults to the process pool of get_executor().
+        """
+        self.fit = fit
+        self.name = name
+        self.patience = patience or int(util.config("forecasting", "order_selection_patience"))
+        self._executor = executor
+        self.best_order = None
+        self.cache = OrderedDict()
+        self._search = None
+
+    @property
+    def executor(self):
+        """ The executor that fits the candidates, or None to fit them one after another """
+        return self._executor if self._executor is not None else get_executor()
+
+    def select(self, history):
+        """
+        Search the order with the lowest AIC.
+
+        Parameters:
+        - history (np.array): The historical values the candidates are fitted to.
+
+        Returns:
+        - tuple: Best order (p, q) based on AIC.
+        """
+        history = np.asarray(history, dtype=float)
+        window = (len(history), hash(history.tobytes()))
+        aics = {}
+
+        def evaluate(orders):
+            todo = [order for order in orders if (window, order) not in self.cache]
+            executor = self.executor
+            fitted = None
+            if executor is not None:
+                try:
+                    fitted = list(executor.map(self.fit, [history] * len(todo), todo))
+                except BrokenExecutor as error:
+                    # The candidates are fitted one after another until the pool is replaced
+                    print(f"Could not fit the {self.name} candidates in the process pool: {error!r}")
+                    discard_executor(executor)
+                    if executor is self._executor:
+                        self._executor = None
+            if fitted is None:
+                fitted = [self.fit(history, order) for order in todo]
+            for order, aic in zip(todo, fitted):
+                self.cache[(window, order)] = aic
+                if len(self.cache) > CACHE_SIZE:
+                    self.cache.popitem(last=False)
+            for order in orders:
+                self.cache.move_to_end((window, order))
+                aics[order] = self.cache[(window, order)]
+            return min((aics[order] for order in orders), default=np.inf)
+
+        # Warm start with the previous best order, which sets the AIC the other candidates have to beat
+        start = self.best_order or ORDERS[0]
+        best_aic = evaluate([self.best_order]) if self.best_order is not None else np.inf
+        levels = sorted({sum(order) for order in ORDERS}, key=lambda level: (abs(level - sum(start)), level))
+        misses = 0
+        for level in levels:
+            orders = [order for order in ORDERS if sum(order) == level and order not in aics]
+            if not orders:
+                continue
+            level_aic = evaluate(orders)
+            if level_aic < best_aic:
+                best_aic = level_aic
+                misses = 0
+            else:
+                misses += 1
+                if misses >= self.patience:
+                    break
+
+        if np.isfinite(best_aic):
+            self.best_order = min(aics, key=aics.get)
+        best_order = self.best_order or ORDERS[0]
+        print(f"Best order {self.name}: {best_order}")
+        return best_order
+
+    def start(self, history):
+        """
+        Start a search in the background, unless a search is running already.
+
+        Parameters:
+        - history (np.array): The historical values the candidates are fitted to.
+        """
+        if self._search is not None:
+            return
+        self._search = get_background().submit(self.select, np.array(history, dtype=float))
+
+    def result(self):
+        """
+        The order found by the background search, once it is finished.
+
+        Returns:
+        - tuple: The new order (p, q), or None while no search has finished or if the search failed.
+        """
+        if self._search is None or not self._search.done():
+            return None
+        search, self._search = self._search, None
+        try:
+            return search.result()
+        except Exception as error:
+            # The model keeps its current order until the next search
+            print(f"Could not select the order of {self.name}: {error!r}")
+            return None
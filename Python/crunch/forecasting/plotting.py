@@ -3,83 +3,102 @@ import matplotlib.pyplot as plt
 
 
 class Plotting:
-    def __init__(self):
-        self.fig, (self.ax, self.mse_ax) = plt.subplots(2, 1, figsize=(10, 12))
-        plt.subplots_adjust(hspace=0.5)
-        plt.ion()
+    """
+    Plots the observations, the forecast and the forecast error of a predictor.
 
-    def plot(self, observations, average_forecasts, forecast, number_of_observations):
+    The axes are only drawn when the figure is created or resized, and an update only redraws the lines
+    on top of the saved background (blitting), so an update is cheap and never waits.
+    The x axis counts the observations relative to the newest observation, so it never has to be redrawn.
+    """
+
+    def __init__(self, observations_to_plot, forecast_length):
         """
         Args:
-                new_value (float): newest actual measured value
-                forecast (np.ndarray): Array of the next 10 forecasted values
+                observations_to_plot (int): number of observations to plot
+                forecast_length (int): number of forecasted values
         """
-        # Reset the plot
-        self.ax.clear()
-
-        # Plot the observations
-        self.ax.plot(observations, label="Observed Value", color="blue")
-
-        # Plot the historical average forecast
-        self.ax.plot(
-            average_forecasts,
-            label="Average Forecast",
-            color="purple",
-            linestyle=":",
-        )
-        # Mark the newest observation
-        self.ax.scatter(
-            len(observations) - 1,
-            observations[-1],
-            color="red",
-            label="New Value",
-        )
-
-        # Adjust the forecast_x_values to start from the current data point
-        forecast_x_values = np.arange(
-            len(observations) - 1, len(observations) + len(forecast)
-        )
-        forecast = np.append(observations[-1], forecast)
-        self.ax.plot(
-            forecast_x_values,
-            forecast,
-            color="green",
-            label="Forecast",
-            linestyle="--",
-        )
+        self.fig, (self.ax, self.mse_ax) = plt.subplots(2, 1, figsize=(10, 12))
+        plt.subplots_adjust(hspace=0.5)
 
+        self.ax.set_xlim(1 - observations_to_plot, forecast_length)
         self.ax.set_ylim(-2, 2)
         self.ax.set_title("Cognitive Load Data and Forecast")
-        self.ax.set_xlabel("Observation Nr.")
+        self.ax.set_xlabel("Observations since the newest observation")
         self.ax.set_ylabel("Z-Score")
-        self.ax.legend()
         self.ax.grid(True)
-
-        # Update the x-axis to reflect the actual data points
-        actual_x_ticks = np.arange(
-            number_of_observations - len(observations) + 1, number_of_observations + 1
+        self.observed_line, = self.ax.plot([], [], label="Observed Value", color="blue", animated=True)
+        self.average_line, = self.ax.plot(
+            [], [], label="Average Forecast", color="purple", linestyle=":", animated=True
         )
-        tick_interval = 1  # Adjust dynamically based on data length
-        self.ax.set_xticks(np.arange(0, len(observations), tick_interval))
-        self.ax.set_xticklabels(actual_x_ticks[::tick_interval])
-
-        plt.draw()  # Update figure
-        plt.pause(0.5)  # Add minor delay to plotting
-
-    def plot_error(self, errors, number_of_observations):
-        """Function for plotting the errors of the average forecast vs the actually observed value."""
-        self.mse_ax.clear()
-
-        x_values = np.arange(
-            number_of_observations - len(errors) + 1, number_of_observations + 1
+        self.new_value, = self.ax.plot(
+            [], [], label="New Value", color="red", marker="o", linestyle="", animated=True
         )
-        self.mse_ax.plot(x_values, errors, label="Error", color="red")
+        self.forecast_line, = self.ax.plot([], [], label="Forecast", color="green", linestyle="--", animated=True)
+        self.observation_text = self.ax.text(0.01, 0.95, "", transform=self.ax.transAxes, va="top", animated=True)
+        self.ax.legend(loc="upper right")
 
+        self.mse_ax.set_xlim(1 - observations_to_plot, 0)
+        self.mse_ax.set_ylim(0, 1)
         self.mse_ax.set_title("Absolute Error Over Time")
-        self.mse_ax.set_xlabel("Observation Nr.")
+        self.mse_ax.set_xlabel("Observations since the newest observation")
         self.mse_ax.set_ylabel("Absolute Error")
-        self.mse_ax.legend()
         self.mse_ax.grid(True)
+        self.error_line, = self.mse_ax.plot([], [], label="Error", color="red", animated=True)
+        self.mse_ax.legend(loc="upper right")
+
+        self.animated = [self.observed_line, self.average_line, self.new_value, self.forecast_line,
+                         self.observation_text, self.error_line]
+        self.background = None
+        # The background is saved every time the whole figure is drawn, e.g. when the window is resized
+        self.fig.canvas.mpl_connect("draw_event", self._save_background)
+
+        plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def _save_background(self, event):
+        """ Save the figure without the lines, and draw the lines on top of it """
+        if self.fig.canvas.supports_blit:
+            self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self.animated:
+            artist.axes.draw_artist(artist)
+
+    def draw(self, snapshot):
+        """
+        Show a snapshot of the predictor
+
+        Args:
+                snapshot (PlotSnapshot): the data to plot
+        """
+        observations = snapshot.observations
+        self.observed_line.set_data(np.arange(1 - len(observations), 1), observations)
+        self.average_line.set_data(
+            np.arange(1 - len(snapshot.average_forecasts), 1), snapshot.average_forecasts
+        )
+        self.new_value.set_data([0], observations[-1:])
+        # The forecast starts from the newest observation
+        self.forecast_line.set_data(
+            np.arange(0, len(snapshot.forecast) + 1), np.append(observations[-1], snapshot.forecast)
+        )
+        self.observation_text.set_text(f"Observation Nr. {snapshot.number_of_observations}")
+        self.error_line.set_data(np.arange(1 - len(snapshot.errors), 1), snapshot.errors)
+
+        max_error = np.max(snapshot.errors, initial=0)
+        if max_error > self.mse_ax.get_ylim()[1] or self.background is None:
+            # The axes change, so the background is drawn again
+            self.mse_ax.set_ylim(0, max(max_error * 1.5, self.mse_ax.get_ylim()[1]))
+            self.fig.canvas.draw()
+        else:
+            self.fig.canvas.restore_region(self.background)
+            self._draw_animated()
+            self.fig.canvas.blit(self.fig.bbox)
+        self.fig.canvas.flush_events()
+
+    def idle(self):
+        """ Keep the window responsive while there is nothing new to draw """
+        self.fig.canvas.flush_events()
 
-        plt.draw()
-        plt.pause(0.5)
+    def close(self):
+        plt.close(self.fig)
@@ -1,7 +1,7 @@
 import numpy as np
 from crunch.forecasting.arma import ARMAClass
 from crunch.forecasting.garch import GARCHClass
-from crunch.forecasting.plotting import Plotting
+from crunch.forecasting.renderer import PlotSnapshot, create_renderer
 import crunch.util as util
 
 
@@ -18,7 +18,7 @@ class Predictor:
     - self.forecast_counter (int): A counter used to keep track of the number of forecasts made so we can divide by the correct number of forecasts to calculate the average forecast for the [forecast_length] first observations.
     - self.average_forecasts (numpy.array): An array of the average forecasts for each observation.
     - self.errors (numpy.array): An array of the errors for each observation.
-    - self.Plotting (Plotting): An instance of the Plotting class.
+    - self.renderer: The renderer of the plots, or None when headless.
     - self.history_used_in_forecasting (int): The number of historical observations used to calculate the forecast.
     - self.observations_to_plot (int): The number of observations to plot.
     - self.forecast_length (int): How far into the future to forecast.
@@ -27,12 +27,13 @@ class Predictor:
 
     """
 
-    def __init__(self, baseline_data):
+    def __init__(self, baseline_data, plotting=None):
         """
         Initializes the Predictor with initial data.
 
         Parameters:
         - baseline_data (numpy.array): The initial array of data used to calculate a baseline.
+        - plotting (str): How the plots are rendered, one of renderer.RENDERERS. Defaults to the config file.
         """
         self.history_used_in_forecasting = int(
             util.config("forecasting", "history_used_in_forecasting")
@@ -47,10 +48,15 @@ class Predictor:
         self.standardized_data = self.standardize(baseline_data)
 
         self.ARMAClass = ARMAClass(
-            self.standardized_data, forecast_length=self.forecast_length
+            self.standardized_data,
+            forecast_length=self.forecast_length,
+            refit_interval=int(util.config("forecasting", "arma_refit_interval")),
+            drift_threshold=float(util.config("forecasting", "arma_drift_threshold")),
         )
         self.GARCHClass = GARCHClass(
-            self.ARMAClass.get_residuals(), forecast_length=self.forecast_length
+            self.ARMAClass.get_residuals(),
+            forecast_length=self.forecast_length,
+            refit_interval=int(util.config("forecasting", "garch_refit_interval")),
         )
 
         self.forecast_matrix = np.zeros(
@@ -61,7 +67,11 @@ class Predictor:
         self.average_forecasts = self.standardized_data
         self.errors = []
 
-        self.Plotting = Plotting()
+        self.renderer = create_renderer(
+            plotting or util.config("forecasting", "plotting"),
+            self.observations_to_plot,
+            self.forecast_length,
+        )
 
         self.first_forecast()
 
@@ -94,15 +104,21 @@ class Predictor:
         # Add the new forecast to the top row
         self.forecast_matrix[0] = self.current_forecast
 
-        self.Plotting.plot(
-            self.standardized_data[-self.observations_to_plot :],
-            self.average_forecasts[-self.observations_to_plot :],
-            self.current_forecast,
-            len(self.standardized_data),
-        )
-        self.Plotting.plot_error(
-            self.errors[-self.observations_to_plot :], len(self.standardized_data)
+        self.plot()
+
+    def observe(self, new_observation):
+        """Adds a new observation without forecasting, e.g. when a newer observation is already waiting.
+        The previous forecast is carried one step forward, so the errors of the next forecasts stay aligned."""
+        standardized_value = self.standardize(new_observation)
+        self.standardized_data = np.append(self.standardized_data, standardized_value)
+
+        self.current_forecast = np.append(
+            self.current_forecast[1:], self.current_forecast[-1]
         )
+        self.forecast_counter += 1
+        self.backtest(standardized_value)
+        self.forecast_matrix[1:] = self.forecast_matrix[:-1]
+        self.forecast_matrix[0] = self.current_forecast
 
     def backtest(self, new_observation):
         """Compute the average absolute error.
@@ -142,9 +158,24 @@ class Predictor:
         # Add the new forecast to the top row
         self.forecast_matrix[0] = self.current_forecast
 
-        self.Plotting.plot(
-            self.standardized_data[-self.observations_to_plot :],
-            self.average_forecasts[-self.observations_to_plot :],
-            self.current_forecast,
-            len(self.standardized_data),
+        self.plot()
+
+    def plot(self):
+        """Hands a snapshot of the observations, forecasts and errors to the renderer."""
+        if self.renderer is None:
+            return
+        self.renderer.submit(
+            PlotSnapshot(
+                self.standardized_data[-self.observations_to_plot :],
+                self.average_forecasts[-self.observations_to_plot :],
+                self.current_forecast,
+                self.errors[-self.observations_to_plot :],
+                len(self.standardized_data),
+            )
         )
+
+    def close(self):
+        """Stops the renderer of the plots."""
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
@@ -0,0 +1,146 @@
+"""
+Renderers of the forecasting plots. pyplot and its GUI backend are only imported by the renderers
+that draw, so a headless predictor never imports them.
+
+headless: nothing is plotted
+inline: the plots are drawn by the predictor itself, between two forecasts
+thread: the plots are drawn by a thread. Most GUI backends only work in the main thread,
+    so this is meant for non-interactive backends, e.g. with MPLBACKEND=Agg
+process: the plots are drawn by a process of their own, which works with every backend. The process is started
+    by a fork server or spawned, as the predictor runs next to other threads
+"""
+import queue
+import threading
+
+import numpy as np
+
+import crunch.util as util
+
+""" Constants """
+RENDERERS = ["headless", "inline", "thread", "process"]
+# Seconds between the GUI event loop updates of a renderer while no snapshot arrives
+IDLE_INTERVAL = 0.1
+
+
+class PlotSnapshot:
+    """ A copy of the data of a predictor to plot, so a renderer never shares arrays with the predictor """
+
+    def __init__(self, observations, average_forecasts, forecast, errors, number_of_observations):
+        """
+        Parameters:
+        - observations (numpy.array): the standardized observations to plot
+        - average_forecasts (numpy.array): the average forecast of each observation to plot
+        - forecast (numpy.array): the current forecast
+        - errors (list): the absolute errors of the average forecasts to plot
+        - number_of_observations (int): the number of observations made so far
+        """
+        self.observations = np.array(observations, dtype=float)
+        self.average_forecasts = np.array(average_forecasts, dtype=float)
+        self.forecast = np.array(forecast, dtype=float)
+        self.errors = np.array(errors, dtype=float)
+        self.number_of_observations = number_of_observations
+
+
+def create_renderer(mode, observations_to_plot, forecast_length):
+    """
+    Create the renderer of a predictor
+
+    Parameters:
+    - mode (str): one of RENDERERS
+    - observations_to_plot (int): the number of observations to plot
+    - forecast_length (int): the number of forecasted values
+
+    Returns:
+    - the renderer, or None when headless
+    """
+    assert mode in RENDERERS, f"Unknown plotting mode {mode}"
+    if mode == "headless":
+        return None
+    if mode == "inline":
+        return InlineRenderer(observations_to_plot, forecast_length)
+    return BackgroundRenderer(mode, observations_to_plot, forecast_length)
+
+
+class InlineRenderer:
+    """ Draws every snapshot right away """
+
+    def __init__(self, observations_to_plot, forecast_length):
+        from crunch.forecasting.plotting import Plotting
+
+        self.plotting = Plotting(observations_to_plot, forecast_length)
+
+    def submit(self, snapshot):
+        self.plotting.draw(snapshot)
+
+    def close(self):
+        self.plotting.close()
+
+
+class BackgroundRenderer:
+    """
+    Draws the snapshots in a thread or a process, so plotting never blocks forecasting.
+
+    The snapshots are handed over in a mailbox with room for one snapshot. A new snapshot replaces the one
+    that is not drawn yet, so submitting never waits, and a slow renderer skips to the newest snapshot.
+    """
+
+    def __init__(self, mode, observations_to_plot, forecast_length):
+        """
+        Parameters:
+        - mode (str): thread or process
+        - observations_to_plot (int): the number of observations to plot
+        - forecast_length (int): the number of forecasted values
+        """
+        assert mode in ["thread", "process"], f"Unknown renderer {mode}"
+        if mode == "thread":
+            self.mailbox = queue.Queue(maxsize=1)
+            worker = threading.Thread
+        else:
+            context = util.process_context()
+            self.mailbox = context.Queue(maxsize=1)
+            worker = context.Process
+        self.worker = worker(
+            target=_render, args=(self.mailbox, observations_to_plot, forecast_length), daemon=True
+        )
+        self.worker.start()
+
+    def submit(self, snapshot):
+        """ Replace the snapshot waiting to be drawn, without waiting for the renderer """
+        _put_latest(self.mailbox, snapshot)
+
+    def close(self):
+        """ Stop the renderer after the snapshot it is drawing """
+        _put_latest(self.mailbox, None)
+        self.worker.join(timeout=1)
+
+
+def _put_latest(mailbox, item):
+    """ Put an item in a mailbox with room for one item, replacing the item in it """
+    while True:
+        try:
+            mailbox.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        try:
+            mailbox.get_nowait()
+        except queue.Empty:
+            # The renderer took the item in the meantime, or a process queue has not flushed it to the pipe yet
+            pass
+
+
+def _render(mailbox, observations_to_plot, forecast_length):
+    """ Draw the newest snapshot in the mailbox until None is received """
+    from crunch.forecasting.plotting import Plotting
+
+    plotting = Plotting(observations_to_plot, forecast_length)
+    while True:
+        try:
+            snapshot = mailbox.get(timeout=IDLE_INTERVAL)
+        except queue.Empty:
+            plotting.idle()
+            continue
+        if snapshot is None:
+            break
+        plotting.draw(snapshot)
+    plotting.close()
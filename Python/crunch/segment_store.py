@@ -0,0 +1,188 @@
+"""
+Compact binary store for measurements, an alternative to the csv files in the output directory.
+
+A measurement stream is stored in one segment file per session. A segment starts with a small header
+with the column names, followed by fixed-width records of float64 values, one per column. A reader
+can memory-map a segment and slice the last rows without parsing anything.
+
+Export segments to csv files in the current directory with:
+    python -m crunch.segment_store <segment> [<segment> ...]
+"""
+import argparse
+import csv
+import glob
+import os
+import struct
+
+import numpy as np
+
+""" Constants """
+MAGIC = b"CRUNCHSG"
+VERSION = 1
+# magic, version, number of columns, length of the column names
+HEADER = struct.Struct("<8sIII")
+SUFFIX = ".seg"
+
+
+def segment_path(directory, path, session):
+    """
+    The path of the segment of a measurement stream in a session
+
+    :param directory: the output directory
+    :type directory: str
+    :param path: the name of the measurement stream, e.g. "arousal.csv"
+    :type path: str
+    :param session: the id of the session
+    :type session: str
+    :rtype: str
+    """
+    stem = os.path.splitext(path)[0]
+    return os.path.join(directory, f"{stem}.{session}{SUFFIX}")
+
+
+def latest_segment(directory, path):
+    """
+    The segment of the latest session of a measurement stream, or None if there is none
+
+    :param directory: the output directory
+    :type directory: str
+    :param path: the name of the measurement stream, e.g. "arousal.csv"
+    :type path: str
+    :rtype: str
+    """
+    stem = os.path.splitext(path)[0]
+    segments = sorted(glob.glob(os.path.join(directory, glob.escape(stem) + ".*" + SUFFIX)), key=os.path.getmtime)
+    return segments[-1] if segments else None
+
+
+def _data_offset(names_length):
+    """ Records start at the first multiple of 8 bytes after the header, so the float64 values are aligned """
+    return -(-(HEADER.size + names_length) // 8) * 8
+
+
+class SegmentFile:
+    """ Appends records to a new segment file, with the same interface as the csv files of the MeasurementWriter """
+
+    def __init__(self, path, columns):
+        """
+        :param path: the path of the segment, the file must not exist
+        :type path: str
+        :param columns: the names of the columns
+        :type columns: list of str
+        """
+        self.path = path
+        self.columns = list(columns)
+        names = "\n".join(self.columns).encode()
+        self.file = open(path, "xb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(self.columns), len(names)))
+        self.file.write(names.ljust(_data_offset(len(names)) - HEADER.size, b"\0"))
+        # Readers need the whole header before the first records are flushed
+        self.file.flush()
+
+    def writerow(self, row):
+        """
+        :param row: one value per column
+        :type row: list of float
+        """
+        record = np.asarray(row, dtype="<f8")
+        assert record.shape == (len(self.columns),), \
+            f"{self.path}: Expected {len(self.columns)} values, got {record.shape}"
+        self.file.write(record.tobytes())
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def read_header(path):
+    """
+    Read the header of a segment
+
+    :param path: the path of the segment
+    :type path: str
+    :return: the column names, and the offset of the first record
+    :rtype: (list of str, int)
+    """
+    with open(path, "rb") as file:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path} has no complete segment header")
+        magic, version, number_of_columns, names_length = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} segment")
+        columns = file.read(names_length).decode().split("\n")
+    assert len(columns) == number_of_columns, f"{path}: Corrupt column names"
+    return columns, _data_offset(names_length)
+
+
+def read_segment(path):
+    """
+    Memory-map the records of a segment. A record that is still being written is left out
+
+    :param path: the path of the segment
+    :type path: str
+    :return: the column names, and a read-only array with one row per record
+    :rtype: (list of str, np.ndarray)
+    """
+    columns, offset = read_header(path)
+    rows = (os.path.getsize(path) - offset) // (8 * len(columns))
+    if rows == 0:
+        return columns, np.empty((0, len(columns)))
+    return columns, np.memmap(path, dtype="<f8", mode="r", offset=offset, shape=(rows, len(columns)))
+
+
+def last_rows(path, count):
+    """
+    The last records of a segment
+
+    :param path: the path of the segment
+    :type path: str
+    :param count: the max number of records
+    :type count: int
+    :return: the column names, and a read-only array with the last [count] records
+    :rtype: (list of str, np.ndarray)
+    """
+    columns, rows = read_segment(path)
+    return columns, rows[max(len(rows) - count, 0):]
+
+
+def export_csv(path, csv_path=None):
+    """
+    Export a segment to a csv file with the same layout as the csv files of the MeasurementWriter
+
+    :param path: the path of the segment
+    :type path: str
+    :param csv_path: the path of the csv file, defaults to the name of the segment with a .csv suffix in the
+        current directory. Not next to the segment, where the websocket server would forecast it as a new stream
+    :type csv_path: str
+    :return: the path of the csv file
+    :rtype: str
+    """
+    csv_path = csv_path or os.path.splitext(os.path.basename(path))[0] + ".csv"
+    columns, rows = read_segment(path)
+    with open(csv_path, "w", newline="") as file:
+        writer = csv.writer(file, delimiter=",")
+        writer.writerow(columns)
+        writer.writerows(rows.tolist())
+    return csv_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export measurement segments to csv files")
+    parser.add_argument("segments", nargs="+", help="the segment files to export")
+    parser.add_argument("-o", "--output", help="the csv file, only when a single segment is exported")
+    args = parser.parse_args(argv)
+    if args.output and len(args.segments) > 1:
+        parser.error("--output can only be used with a single segment")
+
+    for segment in args.segments:
+        print(export_csv(segment, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import multiprocessing
+import os
+import threading
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+import crunch.util as util
+
+
+class SharedRing:
+    """
+    Ring buffer of measurement records in shared memory, written by one process and read by another.
+
+    The shared memory starts with a sequence counter, the number of records ever appended,
+    followed by a stamp for each slot and room for [capacity] records of float64 values, one per column.
+    The writer stores a record before it increments the counter, so the reader never sees a record
+    that is not appended yet. The stamp of a slot is the sequence number of the record in it, and is
+    cleared while the record is overwritten, so a reader that falls [capacity] records behind
+    skips the records that were overwritten while it copied them, and loses the oldest ones.
+
+    The reader owns the shared memory: the writer only detaches from it when it closes the ring,
+    so the reader can still read the last records, and the reader frees it.
+    """
+
+    def __init__(self, columns, capacity, name=None):
+        """
+        :param columns: the names of the columns of a record
+        :type columns: list of str
+        :param capacity: number of records the ring has room for
+        :type capacity: int
+        :param name: the name of the shared memory of an existing ring, or None to create a new ring
+        :type name: str
+        """
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.owner = name is None
+        if self.owner:
+            self.memory = SharedMemory(create=True, size=8 + 8 * capacity * (1 + len(self.columns)))
+            _untrack(self.memory)
+        else:
+            self.memory = SharedMemory(name=name)
+        self.name = self.memory.name
+        self.sequence = np.ndarray((1,), dtype=np.int64, buffer=self.memory.buf)
+        self.stamps = np.ndarray((capacity,), dtype=np.int64, buffer=self.memory.buf, offset=8)
+        self.records = np.ndarray(
+            (capacity, len(self.columns)), dtype=np.float64, buffer=self.memory.buf, offset=8 + 8 * capacity
+        )
+        if self.owner:
+            self.sequence[0] = 0
+            self.stamps[:] = -1
+
+    def append(self, row):
+        """
+        :param row: one value per column
+        :type row: list of float
+        """
+        sequence = int(self.sequence[0])
+        slot = sequence % self.capacity
+        self.stamps[slot] = -1
+        self.records[slot] = row
+        self.stamps[slot] = sequence
+        self.sequence[0] = sequence + 1
+
+    def read(self, start):
+        """
+        Read the records appended since a sequence number
+
+        :param start: the sequence number of the first record to read
+        :type start: int
+        :return: the records, the sequence number to read from next time, and the number of records that were lost
+        :rtype: (np.ndarray, int, int)
+        """
+        end = int(self.sequence[0])
+        first = max(start, end - self.capacity)
+        sequences = np.arange(first, end)
+        slots = sequences % self.capacity
+        stamps = self.stamps[slots]
+        rows = self.records[slots]
+        # A record is only valid if its slot held it before and after it was copied. The writer overwrites
+        # the oldest records first, so the records it overwrote while they were copied come first
+        valid = (stamps == sequences) & (self.stamps[slots] == sequences)
+        overwritten = len(valid) - np.argmin(valid[::-1]) if not valid.all() else 0
+        rows = rows[overwritten:]
+        return rows, end, first + overwritten - start
+
+    def close(self, unlink=False):
+        """
+        Detach from the shared memory
+
+        :param unlink: free the shared memory as well, which only the reader does
+        :type unlink: bool
+        """
+        # The shared memory can only be closed when no array refers to it
+        self.sequence = self.stamps = self.records = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+def _untrack(memory):
+    """
+    Keep the resource tracker from freeing shared memory created by this process when the process exits,
+    as the shared memory is freed by the process that reads it
+    """
+    if os.name == "posix":
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(memory._name, "shared_memory")
+
+
+class MeasurementTransport:
+    """
+    Moves measurement rows from the sensor processes to the websocket process through shared memory.
+
+    Create the transport in the websocket process before the sensor processes are started, and hand it
+    to them. Every sensor process publishes each measurement stream to a SharedRing of its own, and
+    announces new rings to the websocket process through a queue. After a row is published, the
+    websocket process is woken up through a pipe, unless a wakeup is already pending, so the pipe
+    never fills up. The websocket process waits for fileno() to be readable and then calls receive().
+
+    The websocket process owns the rings: a sensor process that stops only detaches from its rings,
+    so the websocket process still receives their last rows, and the websocket process frees them in close().
+    """
+
+    def __init__(self, capacity=None):
+        """
+        :param capacity: number of rows each ring has room for, defaults to the config file
+        :type capacity: int
+        """
+        self.capacity = capacity or int(util.config("transport", "capacity"))
+        self._announcements = multiprocessing.SimpleQueue()
+        self._wakeup_reader, self._wakeup_writer = multiprocessing.Pipe(duplex=False)
+        self._wakeup_pending = multiprocessing.Value("b", 0, lock=False)
+        # The rings published by this process
+        self._rings = {}
+        self._publish_lock = threading.Lock()
+        # The rings received by this process, and the sequence number to read from next in each of them
+        self._streams = {}
+        # Number of rows lost because the websocket process fell more than [capacity] rows behind
+        self.dropped = 0
+
+    def __getstate__(self):
+        """ A process that gets the transport starts without the rings of the process that sent it """
+        state = self.__dict__.copy()
+        state.update(_rings={}, _publish_lock=None, _streams={})
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._publish_lock = threading.Lock()
+
+    def publish(self, path, row, header_features=[]):
+        """
+        Publish a measurement row to the websocket process
+
+        :param path: the name of the measurement stream, e.g. "arousal.csv"
+        :type path: str
+        :param row: the time and the values of the measurement
+        :type row: list of float
+        :param header_features: the names of the values after the main value
+        :type header_features: list of str
+        """
+        with self._publish_lock:
+            ring = self._rings.get(path)
+            if ring is None:
+                ring = self._rings[path] = SharedRing(["time", "value"] + header_features, self.capacity)
+                self._announcements.put((path, ring.name, ring.columns))
+            ring.append(row)
+            if not self._wakeup_pending.value:
+                self._wakeup_pending.value = 1
+                self._wakeup_writer.send_bytes(b"\0")
+
+    def fileno(self):
+        """ File descriptor that is readable when there are new rows to receive """
+        return self._wakeup_reader.fileno()
+
+    def receive(self):
+        """
+        Receive the rows published since the last call
+
+        :return: the name, the column names and the new rows of each measurement stream with new rows
+        :rtype: list of (str, list of str, np.ndarray)
+        """
+        # Drain the pipe, and then clear the wakeup before reading, so rows published from now on wake us up again.
+        # Clearing it before draining could drain the wakeup of a row published in between, and leave it set
+        while self._wakeup_reader.poll():
+            self._wakeup_reader.recv_bytes()
+        self._wakeup_pending.value = 0
+        received = []
+        for path, ring in self._attach_announced():
+            if path in self._streams:
+                # A sensor process published the stream again, so the old ring is read to the end and freed
+                self._read(path, received)
+                self._streams[path][0].close(unlink=True)
+            self._streams[path] = [ring, 0]
+        for path in self._streams:
+            self._read(path, received)
+        return received
+
+    def _attach_announced(self):
+        """ Attach to the rings announced since the last call, as (path, ring) pairs """
+        while not self._announcements.empty():
+            path, name, columns = self._announcements.get()
+            try:
+                yield path, SharedRing(columns, self.capacity, name)
+            except FileNotFoundError:
+                # The ring was freed already
+                continue
+
+    def _read(self, path, received):
+        """ Add the new rows of a received stream to [received] """
+        stream = self._streams[path]
+        rows, stream[1], dropped = stream[0].read(stream[1])
+        self.dropped += dropped
+        if len(rows):
+            received.append((path, stream[0].columns, rows))
+
+    def detach(self):
+        """ Detach from the rings this process published, and leave them to the websocket process """
+        for ring in self._rings.values():
+            ring.close()
+        self._rings = {}
+
+    def close(self):
+        """ Free the rings this process received, including the rings announced since the last receive() """
+        self.detach()
+        for path, ring in self._attach_announced():
+            ring.close(unlink=True)
+        for ring, _ in self._streams.values():
+            ring.close(unlink=True)
+        self._streams = {}
+
+
+# The transport the measurements of this process are published to
+_transport = None
+
+
+def set_transport(transport):
+    """
+    Publish the measurements of this process to a transport
+
+    :type transport: MeasurementTransport
+    """
+    global _transport
+    _transport = transport
+
+
+def publish(path, row, header_features=[]):
+    """ Publish a measurement row to the transport of this process, if it has one """
+    if _transport is not None:
+        _transport.publish(path, row, header_features)
+
+
+def close_transport():
+    """ Detach from the rings this process published, and stop publishing """
+    global _transport
+    if _transport is not None:
+        _transport.detach()
+    _transport = None
@@ -1,22 +1,31 @@
 import configparser
-import csv
+import functools
 import os
 import time
 
 
 def write_csv(path, row, header_features=[]):
-    """ write result to csv file """
+    """ publish result to the websocket process, and write it to csv file through the buffered writer """
     if path is not None:
-        if not os.path.exists("crunch/output"):
-            os.makedirs("crunch/output")
+        from crunch.transport import publish
+        from crunch.writer import get_writer
+        row = [time.time()] + row
+        publish(path, row, header_features)
+        writer = get_writer()
+        if writer is not None:
+            writer.write(path, row[1:], header_features, timestamp=row[0])
 
-        file_exists = os.path.isfile("crunch/output/" + path)
-        with open("crunch/output/" + path, "a", newline="") as csvfile:
-            writer = csv.writer(csvfile, delimiter=",")
-            if not file_exists:
-                header = ['time', 'value']
-                writer.writerow(header + header_features)
-            writer.writerow([time.time()] + row)
+
+def process_context():
+    """
+    The multiprocessing context of the processes started while other threads may be running.
+    Forking a process with threads can deadlock the child, so the processes are started by a fork server,
+    or spawned where there is none
+    """
+    import multiprocessing
+
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
 
 
 def to_list(x):
@@ -28,14 +37,26 @@ def to_list(x):
         return [x]
 
 
-def config(section, key=None):
-    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../setup.cfg')
+def _config_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), '../setup.cfg')
 
+
+@functools.lru_cache(maxsize=None)
+def _load_config():
+    """ The parsed configuration file, read once per process """
     conf = configparser.ConfigParser()
-    try:
-        conf.read(config_path)
-    except FileNotFoundError:
+    if not conf.read(_config_path()):
         raise FileNotFoundError("Couldn't find configuration file")
+    return conf
+
+
+def reload_config():
+    """ Read the configuration file again on the next call to config, e.g. after it is changed """
+    _load_config.cache_clear()
+
+
+def config(section, key=None):
+    conf = _load_config()
 
     if section not in conf:
         raise Exception(f"The section named {section} does not exist in the config file.")
@@ -0,0 +1,133 @@
+import asyncio
+from collections import OrderedDict
+
+
+class ClientQueue:
+    """
+    Bounded queue of the messages waiting to be sent to one websocket client.
+
+    When the queue is full, the oldest message is dropped (drop_oldest). With coalesce,
+    a new message replaces the queued message with the same key instead, e.g. the previous
+    forecast of the same stream, so a slow client only gets the latest message of each stream.
+    """
+
+    policies = ["drop_oldest", "coalesce"]
+
+    def __init__(self, max_size, policy):
+        """
+        :param max_size: max number of queued messages
+        :type max_size: int
+        :param policy: what to do with messages the client is too slow for, one of policies
+        :type policy: str
+        """
+        assert policy in self.policies, f"Unknown queue policy {policy}"
+        self.max_size = max_size
+        self.policy = policy
+        self.messages = OrderedDict()
+        self.dropped = 0
+        self._counter = 0
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def put(self, message, key=None):
+        """
+        Queue a message without waiting
+
+        :param message: the message
+        :type message: any
+        :param key: messages with the same key replace each other with the coalesce policy
+        :type key: str
+        """
+        if self.policy == "coalesce" and key is not None:
+            if ("key", key) in self.messages:
+                self.dropped += 1
+            # A replaced message moves to the end of the queue
+            self.messages.pop(("key", key), None)
+            self.messages[("key", key)] = message
+        else:
+            self._counter += 1
+            self.messages[("message", self._counter)] = message
+        while len(self.messages) > self.max_size:
+            self.messages.popitem(last=False)
+            self.dropped += 1
+        self._ready.set()
+
+    async def get(self):
+        """ Wait for the oldest queued message and remove it from the queue """
+        while not self.messages:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.messages.popitem(last=False)[1]
+
+
+class BroadcastHub:
+    """
+    Sends every message to all connected websocket clients.
+
+    Each client gets its own bounded ClientQueue, and publishing never waits for a client,
+    so a slow client only loses its own messages and never stalls the others, and messages
+    are not kept when no client is connected.
+    """
+
+    def __init__(self, max_queue_size, policy):
+        """
+        :param max_queue_size: max number of messages queued for each client
+        :type max_queue_size: int
+        :param policy: what to do with messages a client is too slow for, one of ClientQueue.policies
+        :type policy: str
+        """
+        assert policy in ClientQueue.policies, f"Unknown queue policy {policy}"
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.clients = set()
+        self.published = 0
+        # Messages dropped for clients that are no longer connected
+        self.dropped_disconnected = 0
+
+    def register(self):
+        """
+        Add a client
+
+        :return: the queue of the messages to send to the client
+        :rtype: ClientQueue
+        """
+        client = ClientQueue(self.max_queue_size, self.policy)
+        self.clients.add(client)
+        return client
+
+    def unregister(self, client):
+        """ Remove a client """
+        if client in self.clients:
+            self.clients.remove(client)
+            self.dropped_disconnected += client.dropped
+
+    def publish(self, message, key=None):
+        """
+        Queue a message for every client
+
+        :param message: the message
+        :type message: any
+        :param key: messages with the same key replace each other with the coalesce policy
+        :type key: str
+        """
+        self.published += 1
+        for client in self.clients:
+            client.put(message, key)
+
+    def stats(self):
+        """
+        Counters of the hub
+
+        :return: number of clients and published messages, dropped messages in total, and the queue depths
+        :rtype: dict
+        """
+        depths = [len(client) for client in self.clients]
+        return {
+            "clients": len(self.clients),
+            "published": self.published,
+            "dropped": self.dropped_disconnected + sum(client.dropped for client in self.clients),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+        }
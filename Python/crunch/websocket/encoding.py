@@ -0,0 +1,129 @@
+"""
+Encodings of the forecasts sent to the websocket clients. A client chooses its encoding when it
+connects, with the encoding query parameter, e.g. ws://localhost:8080/?encoding=float32
+
+Every value is sent on its own as soon as it is measured, and its forecast follows in a message of its own
+when it is computed. By then newer values may have been sent, so a forecast does not carry the value it
+was computed from, and clients only show the current value of the value messages.
+
+json (default): a text frame with a JSON object, e.g.
+    {"Stream": "cognitive_load", "Current cognitive load": 0.53} for a value, and
+    {"Stream": "cognitive_load", "Forecasted cognitive load": [0.41, 0.38, ...], "Need help": "False"}
+    for a forecast
+msgpack: a binary frame with the same object as MessagePack, if the msgpack package is installed
+float32: a binary frame with the packed little-endian values
+    uint8 length of the stream name, the stream name in utf-8, uint8 need help (0 or 1),
+    float32 current value (NaN for a forecast), uint16 forecast length (0 for a value), float32 forecast values
+"""
+import json
+import struct
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+""" Constants """
+ENCODINGS = ["json", "msgpack", "float32"]
+DEFAULT_ENCODING = "json"
+FLOAT32_HEADER = struct.Struct("<?fH")
+
+
+def negotiate_encoding(path):
+    """
+    The encoding a client asked for in the path of its connection, or json if it is not supported
+
+    :param path: the path of the websocket connection, e.g. "/?encoding=msgpack"
+    :type path: str
+    :rtype: str
+    """
+    encoding = parse_qs(urlparse(path or "").query).get("encoding", [DEFAULT_ENCODING])[-1]
+    if encoding not in ENCODINGS or (encoding == "msgpack" and msgpack is None):
+        return DEFAULT_ENCODING
+    return encoding
+
+
+class Forecast:
+    """
+    A value or a forecast of an output stream for the clients. Each encoding is only computed once,
+    the first time a client needs it, and shared by all clients that use the same encoding.
+    """
+
+    def __init__(self, stream, value, forecast=None, need_help=None):
+        """
+        :param stream: the name of the output stream
+        :type stream: str
+        :param value: the current value of the stream, or the value the forecast was computed from
+        :type value: float
+        :param forecast: the forecasted values, or None to send the current value
+        :type forecast: np.ndarray
+        :param need_help: whether the current or forecasted values are outliers
+        :type need_help: bool
+        """
+        self.stream = stream
+        self.value = float(value)
+        self.forecast = None if forecast is None else np.asarray(forecast, dtype=float).ravel()
+        self.need_help = bool(need_help)
+        self._encoded = {}
+
+    def to_dict(self):
+        """
+        The value or forecast as the object sent to json and msgpack clients. Need help stays the string
+        "True" or "False" that the Typescript listener compares with
+
+        :rtype: dict
+        """
+        if self.forecast is None:
+            return {"Stream": self.stream, "Current cognitive load": self.value}
+        return {
+            "Stream": self.stream,
+            "Forecasted cognitive load": self.forecast.tolist(),
+            "Need help": str(self.need_help),
+        }
+
+    def encode(self, encoding):
+        """
+        :param encoding: one of ENCODINGS
+        :type encoding: str
+        :return: the payload of the websocket frame, text for json and binary for the others
+        :rtype: str or bytes
+        """
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            if encoding == "json":
+                encoded = json.dumps(self.to_dict())
+            elif encoding == "msgpack":
+                encoded = msgpack.packb(self.to_dict())
+            elif encoding == "float32":
+                name = self.stream.encode()
+                if self.forecast is None:
+                    value, forecast = self.value, np.empty(0)
+                else:
+                    value, forecast = np.nan, self.forecast
+                encoded = (bytes([len(name)]) + name
+                           + FLOAT32_HEADER.pack(self.need_help, value, len(forecast))
+                           + forecast.astype("<f4").tobytes())
+            else:
+                raise ValueError(f"Unknown encoding {encoding}")
+            self._encoded[encoding] = encoded
+        return encoded
+
+
+def decode_float32(payload):
+    """
+    Decode a float32 frame, e.g. for a Python client
+
+    :param payload: the binary frame
+    :type payload: bytes
+    :return: the stream, the current value (NaN for a forecast), the forecast and whether help is needed
+    :rtype: (str, float, np.ndarray, bool)
+    """
+    name_length = payload[0]
+    stream = payload[1:1 + name_length].decode()
+    offset = 1 + name_length
+    need_help, value, forecast_length = FLOAT32_HEADER.unpack_from(payload, offset)
+    forecast = np.frombuffer(payload, dtype="<f4", count=forecast_length, offset=offset + FLOAT32_HEADER.size)
+    return stream, value, forecast, need_help
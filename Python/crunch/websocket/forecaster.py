@@ -0,0 +1,119 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from crunch.websocket.predictors import PredictorRegistry
+
+""" Constants """
+EXECUTORS = ["thread", "process"]
+
+# The predictors of the forecasting process, when the forecasts are computed in a process
+_registry = None
+
+
+def _start_registry(baseline_items, idle_timeout):
+    """ Create the predictors of the forecasting process """
+    global _registry
+    from crunch.forecasting.order_selection import disable_executor
+
+    disable_executor()
+    _registry = PredictorRegistry(baseline_items, idle_timeout)
+
+
+def _update_registry(stream, values):
+    """ Update the forecast of a stream in the forecasting process """
+    return _registry.update_values(stream, values)
+
+
+def _evict_registry():
+    """ Remove the idle streams of the forecasting process """
+    return _registry.evict_idle()
+
+
+class Forecaster:
+    """
+    Forecasts the values of the output streams in an executor, so the event loop keeps sending
+    messages and receiving measurements while the models are fitted.
+
+    Every stream has a mailbox of the values that arrived since its forecast was started, and only one
+    forecast of a stream runs at a time. When it is finished, the next forecast takes all waiting values
+    at once: the older values are only added to the history, and only the newest value is forecasted,
+    so a stream never falls behind because of stale forecasts.
+
+    With a thread, the predictors live in the websocket process. With a process, they live in
+    a forecasting process of their own, so fitting never holds the GIL of the event loop.
+    """
+
+    def __init__(self, predictors, executor, publish):
+        """
+        :param predictors: the predictors of the output streams
+        :type predictors: PredictorRegistry
+        :param executor: where the forecasts are computed, one of EXECUTORS
+        :type executor: str
+        :param publish: called in the event loop with every forecast
+        :type publish: (Forecast) -> None
+        """
+        assert executor in EXECUTORS, f"Unknown forecast executor {executor}"
+        if executor == "process":
+            self.executor = ProcessPoolExecutor(
+                1, initializer=_start_registry, initargs=(predictors.baseline_items, predictors.idle_timeout)
+            )
+            self._update = _update_registry
+            self._evict = _evict_registry
+        else:
+            # One thread, so the predictors are never used by two threads at once
+            self.executor = ThreadPoolExecutor(1, thread_name_prefix="forecaster")
+            self._update = predictors.update_values
+            self._evict = predictors.evict_idle
+        self.publish = publish
+        self.mailboxes = {}
+        self.running = set()
+        # Number of values that were added to the history without a forecast of their own
+        self.skipped = 0
+
+    def submit(self, stream, value):
+        """
+        Forecast a new value of a stream, without waiting. Must be called in the event loop
+
+        :param stream: the name of the output stream
+        :type stream: str
+        :param value: the new value
+        :type value: float
+        """
+        self.mailboxes.setdefault(stream, []).append(float(value))
+        if stream not in self.running:
+            self._start(stream)
+
+    def _start(self, stream):
+        values = self.mailboxes.pop(stream)
+        self.skipped += len(values) - 1
+        self.running.add(stream)
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self._update, stream, values)
+        future.add_done_callback(lambda done: self._finished(stream, done))
+
+    def _finished(self, stream, future):
+        """ Publish a finished forecast, and start the next forecast of the stream if values are waiting """
+        self.running.discard(stream)
+        if future.cancelled():
+            return
+        try:
+            forecast = future.result()
+        except Exception as error:
+            print(f"Could not forecast {stream}: {error!r}")
+            forecast = None
+        if forecast is not None:
+            self.publish(forecast)
+        if stream in self.mailboxes:
+            self._start(stream)
+
+    async def evict_idle(self):
+        """
+        Remove the idle streams in the executor, so a predictor is never evicted while it forecasts
+
+        :return: the names of the evicted streams
+        :rtype: list of str
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._evict)
+
+    def close(self):
+        """ Stop the executor, without waiting for the running forecasts """
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,141 @@
+import os
+import time
+
+import numpy as np
+
+from crunch.websocket.encoding import Forecast
+
+
+def stream_name(path):
+    """
+    The name of the output stream a measurement file or transport path belongs to,
+    e.g. "arousal" for "crunch/output/arousal.csv" and for a segment "arousal.<session>.seg"
+
+    :type path: str
+    :rtype: str
+    """
+    return os.path.basename(path).split(".")[0]
+
+
+class StreamPredictor:
+    """ The baseline and the predictor of one output stream """
+
+    def __init__(self, baseline_items):
+        """
+        :param baseline_items: number of values used to create the predictor
+        :type baseline_items: int
+        """
+        self.baseline_items = baseline_items
+        self.baseline_values = []
+        self.predictor = None
+        self.last_update = time.monotonic()
+
+    def update(self, value, now, forecast=True):
+        """
+        Add a new value to the baseline, or update the forecast with it
+
+        :param value: the new value of the stream
+        :type value: float
+        :param now: the current time.monotonic()
+        :type now: float
+        :param forecast: forecast with the value, or only add it to the history because a newer value is waiting
+        :type forecast: bool
+        :return: whether there is a forecast
+        :rtype: bool
+        """
+        self.last_update = now
+        if self.predictor is not None:
+            if forecast:
+                self.predictor.update_and_predict(value)
+            else:
+                self.predictor.observe(value)
+            return True
+
+        self.baseline_values.append(value)
+        if len(self.baseline_values) < self.baseline_items:
+            return False
+        # Instantiate predictor when there are enough values to create baseline, and create the initial forecast.
+        # The forecasting stack is imported here, so importing the websocket server is fast
+        from crunch.forecasting.predictor import Predictor
+        self.predictor = Predictor(np.array(self.baseline_values, dtype=float))
+        self.baseline_values = None
+        return True
+
+
+class PredictorRegistry:
+    """
+    Keeps a predictor for each output stream, so the values of different measurements are never
+    mixed into one history. A predictor is created when its stream has received baseline_items values,
+    and a stream that has not received a value for idle_timeout seconds is evicted, so memory stays bounded.
+    """
+
+    def __init__(self, baseline_items, idle_timeout):
+        """
+        :param baseline_items: number of values used to create the predictor of a stream
+        :type baseline_items: int
+        :param idle_timeout: seconds without a new value before a stream is evicted
+        :type idle_timeout: float
+        """
+        self.baseline_items = baseline_items
+        self.idle_timeout = idle_timeout
+        self.streams = {}
+
+    def update(self, stream, value, now=None):
+        """
+        Update the forecast of a stream with a new value
+
+        :param stream: the name of the output stream
+        :type stream: str
+        :param value: the new value
+        :type value: float
+        :param now: the current time.monotonic(), defaults to now
+        :type now: float
+        :return: the forecast to send to the clients, or None while the baseline of the stream is collected
+        :rtype: Forecast
+        """
+        return self.update_values(stream, [value], now)
+
+    def update_values(self, stream, values, now=None):
+        """
+        Update the forecast of a stream with the values that arrived since its last forecast.
+        Only the newest value is forecasted, the older values are only added to the history
+
+        :param stream: the name of the output stream
+        :type stream: str
+        :param values: the new values, oldest first
+        :type values: list of float
+        :param now: the current time.monotonic(), defaults to now
+        :type now: float
+        :return: the forecast to send to the clients, or None while the baseline of the stream is collected
+        :rtype: Forecast
+        """
+        now = time.monotonic() if now is None else now
+        self.evict_idle(now)
+        predictor = self.streams.get(stream)
+        if predictor is None:
+            predictor = self.streams[stream] = StreamPredictor(self.baseline_items)
+        values = [float(value) for value in values]
+        for value in values[:-1]:
+            predictor.update(value, now, forecast=False)
+        if not predictor.update(values[-1], now):
+            return None
+        return Forecast(stream, values[-1], predictor.predictor.current_forecast, predictor.predictor.is_outlier)
+
+    def evict_idle(self, now=None):
+        """
+        Remove the streams that have not received a value for idle_timeout seconds
+
+        :param now: the current time.monotonic(), defaults to now
+        :type now: float
+        :return: the names of the evicted streams
+        :rtype: list of str
+        """
+        now = time.monotonic() if now is None else now
+        idle = [stream for stream, predictor in self.streams.items()
+                if now - predictor.last_update > self.idle_timeout]
+        for stream in idle:
+            predictor = self.streams.pop(stream)
+            if predictor.predictor is not None:
+                # Stop the renderer of the plots of the stream
+                predictor.predictor.close()
+        return idle
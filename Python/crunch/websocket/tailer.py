@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+
+from crunch.segment_store import SUFFIX, read_header
+
+
+class TailedFile:
+    """ How far a measurement file has been read """
+
+    def __init__(self, identity, offset, columns=None):
+        """
+        :param identity: device and inode of the file, which change when the file is replaced
+        :type identity: (int, int)
+        :param offset: the byte offset of the first row that is not read yet
+        :type offset: int
+        :param columns: number of columns of a binary segment, or None for a csv file
+        :type columns: int
+        """
+        self.identity = identity
+        self.offset = offset
+        self.columns = columns
+
+
+class Tailer:
+    """
+    Reads the rows appended to the measurement files in the output directory since the last read.
+
+    The tailer remembers the byte offset of the first unread row of every file, so each read only
+    parses the newly appended complete rows, and a row that is still being written is read the next time.
+    A file that is replaced (e.g. rotated) or truncated is read again from the start.
+    Both csv files and binary segments are supported.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def skip_existing(self, directory):
+        """
+        Only read rows that are appended to the files in a directory from now on
+
+        :param directory: the output directory
+        :type directory: str
+        """
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                self.read(path, parse=False)
+
+    def read(self, path, parse=True):
+        """
+        Read the rows appended to a file since the last read
+
+        :param path: the path of the csv file or segment
+        :type path: str
+        :param parse: parse the rows, or only skip them
+        :type parse: bool
+        :return: the new rows, one row per measurement with the time as the first column
+        :rtype: np.ndarray
+        """
+        try:
+            with open(path, "rb") as file:
+                stat = os.fstat(file.fileno())
+                identity = (stat.st_dev, stat.st_ino)
+                tailed = self.files.get(path)
+                if tailed is None or tailed.identity != identity or stat.st_size < tailed.offset:
+                    # A new, replaced or truncated file is read from the start
+                    tailed = self._start(path, identity)
+                    if tailed is None:
+                        return np.empty((0, 0))
+                    self.files[path] = tailed
+                file.seek(tailed.offset)
+                data = file.read(stat.st_size - tailed.offset)
+        except FileNotFoundError:
+            self.files.pop(path, None)
+            return np.empty((0, 0))
+
+        if tailed.columns is not None:
+            # Binary segments have fixed width records
+            complete = len(data) - len(data) % (8 * tailed.columns)
+            tailed.offset += complete
+            return np.frombuffer(data[:complete], dtype="<f8").reshape(-1, tailed.columns) if parse else None
+
+        complete = data.rfind(b"\n") + 1
+        tailed.offset += complete
+        return _parse_csv(data[:complete]) if parse else None
+
+    @staticmethod
+    def _start(path, identity):
+        """ Start reading a file from its first row, or return None if the header of a segment is not written yet """
+        if not path.endswith(SUFFIX):
+            return TailedFile(identity, 0)
+        try:
+            columns, offset = read_header(path)
+        except ValueError:
+            return None
+        return TailedFile(identity, offset, len(columns))
+
+
+def _parse_csv(data):
+    """
+    Parse complete csv rows of numbers, skipping the header
+
+    :param data: the rows
+    :type data: bytes
+    :rtype: np.ndarray
+    """
+    rows = []
+    for line in data.splitlines():
+        try:
+            rows.append([float(value) for value in line.split(b",")])
+        except ValueError:
+            # The header, or a row that is not a measurement
+            continue
+    return np.array(rows) if rows else np.empty((0, 0))
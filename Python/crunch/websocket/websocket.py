@@ -1,76 +1,122 @@
 import asyncio
-import functools
-import json
 import os
 import socket
-import pandas as pd
-from crunch.forecasting.predictor import Predictor
 import websockets
-from watchgod import awatch
 import crunch.util as util
+from crunch.websocket.broadcast import BroadcastHub
+from crunch.websocket.encoding import Forecast, negotiate_encoding
+from crunch.websocket.forecaster import Forecaster
+from crunch.websocket.predictors import PredictorRegistry, stream_name
+from crunch.websocket.tailer import Tailer
 
 
 class WebSocketServer:
-    def __init__(self):
-        self.predictor = None
+    def __init__(self, transport=None):
+        """
+        :param transport: receives the measurements from the sensor processes, or None to watch the output files
+        :type transport: MeasurementTransport
+        """
+        self.transport = transport
+        # Reads the new rows of the output files, when there is no transport
+        self.tailer = Tailer()
 
         # Number of entries used to calculate baseline
         self.baseline_items = int(util.config("websocket", "baseline_items"))
+        # One predictor for each output stream
+        self.predictors = PredictorRegistry(self.baseline_items, float(util.config("websocket", "idle_timeout")))
+        # Seconds between the checks for idle streams
+        self.evict_interval = float(util.config("websocket", "evict_interval"))
+        # Sends the forecasts to every connected client
+        self.hub = BroadcastHub(int(util.config("websocket", "client_queue_size")),
+                                util.config("websocket", "client_queue_policy"))
+        # Computes the forecasts outside the event loop
+        self.forecaster = Forecaster(self.predictors, util.config("websocket", "forecast_executor"),
+                                     lambda forecast: self.hub.publish(forecast, key=forecast.stream))
 
-    async def watcher(self, queue):
-        if not os.path.exists("crunch/output"):
-            os.makedirs("crunch/output")
-
-        async for changes in awatch("./crunch/output/"):
-            for a in changes:
-                file_path = a[1]
-                df = pd.read_csv(file_path)
-
-                # Instantiate predictor when there are enough entries to create baseline, and create the initial forecast
-                if self.predictor is None and len(df.index) >= self.baseline_items:
-                    self.predictor = Predictor(
-                        df.iloc[: self.baseline_items, 1].values.astype(float)
-                    )
-                    forecast = self.predictor.current_forecast
-                    is_outlier = self.predictor.is_outlier
-
-                    # Put data in the queue so the websocket can read and send to client
-                    await queue.put(
-                        {
-                            "Current cognitive load": str(df.iloc[-1, 1].astype(float)),
-                            "Forecasted cognitive load": str(forecast),
-                            "Need help": str(is_outlier),
-                        }
-                    )
-
-                # If the predictor has been instantiated, send the newly inserted value to the predictor to update forecast
-                elif self.predictor:
-                    new_value = df.iloc[-1, 1].astype(float)
-                    self.predictor.update_and_predict(new_value)
-                    forecast = self.predictor.current_forecast
-                    is_outlier = self.predictor.is_outlier
-
-                    # Put data in the queue so the websocket can read and send to client
-                    await queue.put(
-                        {
-                            "Current cognitive load": str(df.iloc[-1, 1].astype(float)),
-                            "Forecasted cognitive load": str(forecast),
-                            "Need help": str(is_outlier),
-                        }
-                    )
-
-    async def handler(self, websocket, path, queue):
-        """Pops data from queue and sends over websocket"""
+    def dispatch(self, stream, values):
+        """
+        Send new values of a stream to the clients right away, and forecast them in the background
+
+        :param stream: the name of the output stream
+        :type stream: str
+        :param values: the new values, oldest first
+        :type values: np.ndarray
+        """
+        for value in values:
+            # The value and the forecast of a stream are coalesced separately
+            self.hub.publish(Forecast(stream, value), key=(stream, "value"))
+            self.forecaster.submit(stream, value)
+
+    async def watcher(self):
+        """ Forecast every measurement appended to the files in the output directory """
+        from watchgod import awatch
+
+        output = util.config("output", "directory")
+        if not os.path.exists(output):
+            os.makedirs(output)
+
+        # Rows from earlier sessions are not forecasted
+        self.tailer.skip_existing(output)
+        async for changes in awatch(output):
+            for _, file_path in changes:
+                self.dispatch(stream_name(file_path), self.tailer.read(file_path)[:, 1:2].ravel())
+
+    async def receiver(self):
+        """ Forecast every measurement the sensor processes send through the transport """
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        try:
+            loop.add_reader(self.transport.fileno(), wakeup.set)
+            poll_interval = None
+        except NotImplementedError:
+            # The event loop on Windows can not wait for pipes, so poll the transport instead
+            poll_interval = 0.01
+
+        try:
+            while True:
+                if poll_interval is None:
+                    await wakeup.wait()
+                    wakeup.clear()
+                else:
+                    await asyncio.sleep(poll_interval)
+                for path, _, rows in self.transport.receive():
+                    self.dispatch(stream_name(path), rows[:, 1])
+        finally:
+            if poll_interval is None:
+                loop.remove_reader(self.transport.fileno())
+            self.transport.close()
+
+    async def evictor(self):
+        """ Remove the predictors of idle streams, also when no stream receives values anymore """
+        while True:
+            await asyncio.sleep(self.evict_interval)
+            evicted = await self.forecaster.evict_idle()
+            if evicted:
+                print("Removed the predictors of idle streams", evicted)
+
+    async def handler(self, websocket, path=None):
+        """Pops data from the queue of the client and sends over websocket, in the encoding the client asked for"""
+        encoding = negotiate_encoding(path or getattr(websocket, "path", None))
+        client = self.hub.register()
+        # Stop waiting for data as soon as the client disconnects
+        closed = asyncio.ensure_future(websocket.wait_closed())
         try:
             while True:
-                data = await queue.get()
-                await websocket.send(json.dumps(data))
+                data = asyncio.ensure_future(client.get())
+                await asyncio.wait({data, closed}, return_when=asyncio.FIRST_COMPLETED)
+                if closed.done():
+                    data.cancel()
+                    break
+                await websocket.send(data.result().encode(encoding))
+        except websockets.ConnectionClosed:
+            pass
         finally:
-            print("Lost connection with websocket client")
+            closed.cancel()
+            self.hub.unregister(client)
+            print("Lost connection with websocket client", self.hub.stats())
 
     def start_websocket(self):
         loop = asyncio.get_event_loop()
-        queue = asyncio.Queue()
 
         local_ip = socket.gethostbyname(socket.gethostname())
         ip = (
@@ -85,12 +131,17 @@ class WebSocketServer:
         print("###### Port: ", port)
         print("##################################################################")
 
-        start_server = websockets.serve(
-            functools.partial(self.handler, queue=queue), ip, port
-        )
-        loop.run_until_complete(
-            asyncio.gather(
-                start_server,
-                self.watcher(queue),
+        # permessage-deflate is used for the clients that offer it, unless it is turned off
+        compression = "deflate" if util.config("websocket", "compression") == "deflate" else None
+        start_server = websockets.serve(self.handler, ip, port, compression=compression)
+        try:
+            loop.run_until_complete(
+                asyncio.gather(
+                    start_server,
+                    self.receiver() if self.transport is not None else self.watcher(),
+                    self.evictor(),
+                )
             )
-        )
+        finally:
+            # Stop the forecasting thread or process
+            self.forecaster.close()
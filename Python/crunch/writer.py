@@ -0,0 +1,225 @@
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+
+import crunch.util as util
+from crunch.segment_store import SegmentFile, segment_path
+
+# Marks a request to flush all files in the queue of the writer thread
+_FLUSH = object()
+# Marks the end of the queue of the writer thread
+_CLOSE = object()
+
+
+class CsvFile:
+    """ Appends rows to a csv file, and writes the header if the file is new """
+
+    def __init__(self, path, columns):
+        """
+        :param path: the path of the csv file
+        :type path: str
+        :param columns: the names of the columns
+        :type columns: list of str
+        """
+        self.file = open(path, "a", newline="")
+        self.writer = csv.writer(self.file, delimiter=",")
+        if self.file.tell() == 0:
+            self.writer.writerow(columns)
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+
+    def flush(self):
+        self.file.flush()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class MeasurementWriter:
+    """
+    Writes measurement rows to files in the output directory on a separate thread.
+
+    Each row is stamped with the time it is written, and put in a queue for the writer thread,
+    so computing a measurement never waits for the disk. The writer thread keeps every output file
+    open, and rows are kept in the file buffers until flush_rows rows are written or
+    flush_interval seconds have passed since the first unflushed row, and when the writer is closed.
+    The fsync policy decides when the files are synced to disk: never, on every flush, or on close.
+
+    The rows are written as csv, or as binary segments (see crunch.segment_store) with one new
+    segment per measurement stream for every writer, i.e. every session.
+    """
+
+    fsync_policies = ["never", "flush", "close"]
+    file_formats = ["csv", "binary"]
+
+    def __init__(self, directory=None, flush_rows=None, flush_interval=None, fsync=None, file_format=None,
+                 clock=time.monotonic):
+        """
+        :param directory: the directory of the output files, defaults to the config file
+        :type directory: str
+        :param flush_rows: number of rows written before the files are flushed, defaults to the config file
+        :type flush_rows: int
+        :param flush_interval: max seconds a row is kept in the buffers, defaults to the config file
+        :type flush_interval: float
+        :param fsync: when the files are synced to disk, one of fsync_policies, defaults to the config file
+        :type fsync: str
+        :param file_format: the file format, one of file_formats, defaults to the config file
+        :type file_format: str
+        :param clock: the seconds the flush interval is measured with
+        :type clock: () -> float
+        """
+        self.directory = directory or util.config("output", "directory")
+        self.flush_rows = flush_rows if flush_rows is not None else int(util.config("output", "flush_rows"))
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else float(util.config("output", "flush_interval"))
+        )
+        self.fsync = fsync or util.config("output", "fsync")
+        self.file_format = file_format or util.config("output", "format")
+        assert self.fsync in self.fsync_policies, f"Unknown fsync policy {self.fsync}"
+        assert self.file_format in self.file_formats, f"Unknown format {self.file_format}"
+        self.session = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.clock = clock
+
+        self.files = {}
+        self._queue = queue.SimpleQueue()
+        self._unflushed = 0
+        self._flush_deadline = None
+        self._thread = threading.Thread(target=self._run, name="MeasurementWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, path, row, header_features=[], timestamp=None):
+        """
+        Write a row to a file in the output directory, with the time as the first column
+
+        :param path: the name of the csv file, binary segments get the same name with the session and a .seg suffix
+        :type path: str
+        :param row: the values of the row
+        :type row: list
+        :param header_features: the names of the values after the main value, used if the file is new
+        :type header_features: list of str
+        :param timestamp: the time of the measurement, defaults to the current time
+        :type timestamp: float
+        """
+        self._queue.put((path, [timestamp or time.time()] + row, header_features))
+
+    def flush(self):
+        """ Wait until all rows written so far are flushed to the files """
+        flushed = threading.Event()
+        self._queue.put((_FLUSH, flushed))
+        flushed.wait()
+
+    def close(self):
+        """ Write the remaining rows, close the files and stop the writer thread """
+        if self._thread.is_alive():
+            self._queue.put((_CLOSE, None))
+            self._thread.join()
+
+    def _run(self):
+        """ Write the rows in the queue until the writer is closed """
+        while True:
+            timeout = None
+            if self._flush_deadline is not None:
+                timeout = max(self._flush_deadline - self.clock(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush()
+                continue
+
+            if item[0] is _FLUSH:
+                self._flush()
+                item[1].set()
+            elif item[0] is _CLOSE:
+                self._close_files()
+                return
+            else:
+                self._write_row(*item)
+
+    def _write_row(self, path, row, header_features):
+        """ Write a row to the buffer of the file, and flush the files when the buffers are full or too old """
+        try:
+            file = self.files.get(path)
+            if file is None:
+                file = self.files[path] = self._open(path, header_features)
+            file.writerow(row)
+        except OSError as error:
+            print(f"{path}: Failed to write measurement: {error}")
+            return
+
+        self._unflushed += 1
+        if self._flush_deadline is None:
+            self._flush_deadline = self.clock() + self.flush_interval
+        if self._unflushed >= self.flush_rows or self.clock() >= self._flush_deadline:
+            self._flush()
+
+    def _open(self, path, header_features):
+        """ Open the file of a measurement stream in the configured format """
+        os.makedirs(self.directory, exist_ok=True)
+        columns = ["time", "value"] + header_features
+        if self.file_format == "binary":
+            return SegmentFile(segment_path(self.directory, path, self.session), columns)
+        return CsvFile(os.path.join(self.directory, path), columns)
+
+    def _flush(self):
+        """ Flush the buffers of all files, and sync them to disk if the fsync policy says so """
+        for path, file in self.files.items():
+            try:
+                file.flush()
+                if self.fsync == "flush":
+                    os.fsync(file.fileno())
+            except OSError as error:
+                print(f"{path}: Failed to flush measurements: {error}")
+        self._unflushed = 0
+        self._flush_deadline = None
+
+    def _close_files(self):
+        """ Flush and close all files """
+        self._flush()
+        for path, file in self.files.items():
+            try:
+                if self.fsync != "never":
+                    os.fsync(file.fileno())
+                file.close()
+            except OSError as error:
+                print(f"{path}: Failed to close measurements: {error}")
+        self.files = {}
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    The measurement writer of the process, created on first use. A process started with fork
+    inherits the writer of its parent without the writer thread, so it gets a writer of its own
+
+    :return: the writer, or None if the measurements are not written to files
+    :rtype: MeasurementWriter
+    """
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer_pid != os.getpid():
+            _writer_pid = os.getpid()
+            _writer = None
+            if util.config("output", "persist") == "True":
+                _writer = MeasurementWriter()
+                atexit.register(close_writer)
+        return _writer
+
+
+def close_writer():
+    """ Write the remaining rows and close the measurement writer of the process, if it was used """
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is not None and _writer_pid == os.getpid():
+            _writer.close()
+        _writer = _writer_pid = None
@@ -0,0 +1,114 @@
+import asyncio
+
+from crunch.empatica.api import EmpaticaAPI
+
+
+class MockSubscriber:
+    """ Mock subscriber to test that we receive data points from the api """
+    window_length = 1
+    window_step = 1
+
+    def __init__(self):
+        self.data_points = []
+
+    def add_window(self, window, _):
+        self.data_points.append(window[0])
+
+
+class MockStreamingServer:
+    """ Mock of the E4 streaming server that answers the commands and sends a few samples """
+    def __init__(self, samples, disconnects=0):
+        self.samples = samples  # the samples to send, or a dict of samples per device
+        self.disconnects = disconnects
+        self.connections = 0
+        self.commands = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        samples = self.samples
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode().strip()
+            self.commands.append(command)
+            if command == "device_list":
+                writer.write(b"R device_list 2 | C13A64 Empatica_E4 | A0B1C2 Empatica_E4\r\n")
+            else:
+                if command.startswith("device_connect") and isinstance(self.samples, dict):
+                    samples = self.samples[command.split()[1]]
+                writer.write(f"R {command} OK\r\n".encode())
+            if command == "pause OFF":
+                if self.connections <= self.disconnects:
+                    writer.write(b"R connection lost to device C13A64\r\n")
+                else:
+                    # Send the samples in small pieces to split lines across reads
+                    for i in range(0, len(samples), 5):
+                        writer.write(samples[i:i + 5])
+                        await writer.drain()
+            await writer.drain()
+        writer.close()
+
+
+async def _run_api(server, api, subscribers, expected):
+    mock_server = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    api.serverAddress = "127.0.0.1"
+    api.serverPort = mock_server.sockets[0].getsockname()[1]
+    api.reconnect_delay = 0.01
+
+    async def stop_when_done():
+        while any(len(subscriber.data_points) < expected for subscriber in subscribers):
+            await asyncio.sleep(0.01)
+        api.stop()
+
+    await asyncio.wait_for(asyncio.gather(api.run(), stop_when_done()), 5)
+    mock_server.close()
+
+
+def _make_api(device_ids=("C13A64",)):
+    return EmpaticaAPI(device_ids)
+
+
+def test_stream():
+    """ Test that the api connects to the device and sends the streamed data to its subscribers """
+    samples = b"".join(f"E4_Gsr 1495312512.{i} 0,{i}\r\n".encode() for i in range(1, 20))
+    server = MockStreamingServer(samples)
+    api = _make_api()
+    subscriber = MockSubscriber()
+    api.add_subscriber(subscriber, "EDA")
+
+    asyncio.run(_run_api(server, api, [subscriber], 19))
+
+    assert subscriber.data_points == [float(f"0.{i}") for i in range(1, 20)]
+    assert server.commands == ["device_list", "device_connect C13A64", "pause ON", "device_subscribe gsr ON",
+                               "device_subscribe tmp ON", "device_subscribe ibi ON", "device_subscribe bvp ON",
+                               "device_subscribe acc ON", "pause OFF"]
+
+
+def test_reconnect():
+    """ Test that the api reconnects when the connection to the device is lost """
+    server = MockStreamingServer(b"E4_Hr 1495312512.1 72.5\r\n", disconnects=2)
+    api = _make_api()
+    subscriber = MockSubscriber()
+    api.add_subscriber(subscriber, "HR")
+
+    asyncio.run(_run_api(server, api, [subscriber], 1))
+
+    assert server.connections == 3
+    assert subscriber.data_points == [72.5]
+
+
+def test_multiple_devices():
+    """ Test that the api streams from several devices at once, and keeps the data of each device separate """
+    server = MockStreamingServer({"C13A64": b"E4_Hr 1495312512.1 72.5\r\n", "A0B1C2": b"E4_Hr 1495312512.1 90.0\r\n"})
+    api = _make_api(["C13A64", "A0B1C2"])
+    first_subscriber = MockSubscriber()
+    api.add_subscriber(first_subscriber, "HR", "C13A64")
+    second_subscriber = MockSubscriber()
+    api.add_subscriber(second_subscriber, "HR", "A0B1C2")
+
+    asyncio.run(_run_api(server, api, [first_subscriber, second_subscriber], 1))
+
+    assert server.connections == 2
+    assert first_subscriber.data_points == [72.5]
+    assert second_subscriber.data_points == [90.0]
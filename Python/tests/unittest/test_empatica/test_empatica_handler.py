@@ -0,0 +1,171 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import crunch.util as util
+from crunch.empatica.handler import DataHandler
+from crunch.empatica.measurements import compute_engagement
+from crunch.empatica.ring_buffer import RingBuffer
+from crunch.empatica.window_store import WindowStore
+
+
+class MockMeasurement:
+    """ Mock measurement function that records every window it is called with """
+    def __init__(self):
+        self.windows = []
+
+    def __call__(self, window):
+        self.windows.append(list(window))
+        return window[-1], len(window)
+
+
+def _make_handler(measurement_func, window_length, window_step, baseline_length, executor=None):
+    return DataHandler(
+        measurement_func=measurement_func,
+        window_length=window_length,
+        window_step=window_step,
+        baseline_length=baseline_length,
+        executor=executor
+    )
+
+
+class SlowMeasurement:
+    """ Mock measurement function that takes a random time, so the windows finish out of order """
+    def __init__(self):
+        self.started = threading.Event()
+
+    def __call__(self, window):
+        self.started.set()
+        time.sleep(np.random.uniform(0, 0.01))
+        return window[-1]
+
+
+@pytest.mark.parametrize("window_length, window_step, baseline_length", [(121, 40, 161), (12, 12, 36), (20, 10, 30)])
+@pytest.mark.parametrize("batch_size", [1, 7, 40, 100, 1000])
+def test_add_data_points(window_length, window_step, baseline_length, batch_size):
+    """ Test that adding data points in batches gives the same windows and baseline as adding them one by one """
+    data = np.random.rand(1000) + 1
+    single = MockMeasurement()
+    single_handler = _make_handler(single, window_length, window_step, baseline_length)
+    batch = MockMeasurement()
+    batch_handler = _make_handler(batch, window_length, window_step, baseline_length)
+
+    for datapoint in data:
+        single_handler.add_data_point(datapoint)
+    for i in range(0, len(data), batch_size):
+        batch_handler.add_data_points(data[i:i + batch_size])
+
+    assert len(batch.windows) == len(data) // window_step - -(-window_length // window_step) + 1
+    assert batch.windows == single.windows
+    assert batch_handler.baseline == single_handler.baseline
+
+
+def test_add_acc_data_points():
+    """ Test that the handler gives windows with all three axes of the accelerometer data """
+    measurement = MockMeasurement()
+    handler = _make_handler(measurement, 128, 64, 1280)
+
+    handler.add_data_points(np.random.rand(200, 3))
+
+    assert len(measurement.windows) == 2
+    assert np.asarray(measurement.windows[0]).shape == (128, 3)
+
+
+@pytest.mark.parametrize("batch_size", [1, 5, 40, 300])
+def test_ring_buffer(batch_size):
+    """ Test that the ring buffer window always holds the latest data points, also after it wraps """
+    data = np.random.rand(1000)
+    buffer = RingBuffer(121, capacity=242)
+
+    for i in range(0, len(data), batch_size):
+        buffer.extend(data[i:i + batch_size])
+        end = min(i + batch_size, len(data))
+        np.testing.assert_array_equal(buffer.window(), data[max(end - 121, 0):end])
+
+
+def test_ring_buffer_view():
+    """ Test that the window is a read-only view into the buffer instead of a copy """
+    buffer = RingBuffer(10)
+    for value in range(20):
+        buffer.append(value)
+
+    window = buffer.window()
+    assert np.shares_memory(window, buffer.data)
+    assert not window.flags.writeable
+
+
+def test_window_store():
+    """ Test that handlers with identical windows share one window, and get the same windows as on their own """
+    data = np.random.rand(1000) + 1
+    store = WindowStore()
+    measurements = [MockMeasurement() for _ in range(3)]
+    handlers = [_make_handler(measurements[0], 121, 40, 161), _make_handler(measurements[1], 121, 40, 161),
+                _make_handler(measurements[2], 20, 10, 30)]
+    for handler in handlers:
+        store.add_handler(handler)
+    received = []
+    handlers[1].add_window = lambda window, _: received.append(window)
+
+    for i in range(0, len(data), 64):
+        store.add_data_points(data[i:i + 64])
+
+    assert len(store.windows) == 2
+    assert store.data_buffer.window_length == 121
+    assert np.shares_memory(received[-1], store.data_buffer.data)
+    for measurement, (window_length, window_step) in [(measurements[0], (121, 40)), (measurements[2], (20, 10))]:
+        single = MockMeasurement()
+        _make_handler(single, window_length, window_step, 161).add_data_points(data)
+        assert measurement.windows == single.windows
+
+
+@pytest.fixture
+def written_rows(monkeypatch):
+    """ Record the rows the handlers write instead of writing them to csv """
+    rows = []
+    monkeypatch.setattr(util, "write_csv", lambda path, row, header_features=[]: rows.append(row))
+    return rows
+
+
+def test_executor_window_order(written_rows):
+    """ Test that measurements computed on an executor are written in window order """
+    data = np.arange(1, 1001, dtype=float)
+    with ThreadPoolExecutor(4) as executor:
+        handler = _make_handler(SlowMeasurement(), 20, 10, 30, executor)
+        for i in range(0, len(data), 7):
+            handler.add_data_points(data[i:i + 7])
+
+    assert handler.baseline == [25]
+    np.testing.assert_allclose(np.ravel(written_rows), data[39::10] / 25)
+
+
+def test_executor_does_not_block(written_rows):
+    """ Test that adding data points returns before the measurement of the window is computed """
+    finish = threading.Event()
+    measurement = SlowMeasurement()
+    with ThreadPoolExecutor(1) as executor:
+        handler = _make_handler(lambda window: finish.wait(5) and measurement(window), 10, 10, 10, executor)
+        start = time.perf_counter()
+        handler.add_data_points(np.ones(30))
+        assert time.perf_counter() - start < 1
+        assert not written_rows
+        finish.set()
+    assert len(written_rows) == 2
+
+
+def test_process_executor(written_rows):
+    """ Test that a process pool gives the same measurements as computing them inline """
+    eda = np.cumsum(np.random.normal(0, 0.01, 2000)) + 2
+    handler = DataHandler(compute_engagement, None, 121, 40, 161)
+    handler.add_data_points(eda)
+    inline_rows = written_rows[:]
+    written_rows.clear()
+
+    with ProcessPoolExecutor(2) as executor:
+        handler = DataHandler(compute_engagement, None, 121, 40, 161, executor=executor)
+        for i in range(0, len(eda), 64):
+            handler.add_data_points(eda[i:i + 64])
+
+    assert written_rows == inline_rows
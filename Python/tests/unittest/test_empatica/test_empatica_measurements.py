@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+import statsmodels.api as sm
+
+from crunch.empatica.measurements import (SlidingArousal,
+                                          SlidingEmotionalRegulation,
+                                          SlidingStress,
+                                          compute_arousal,
+                                          compute_emotional_regulation,
+                                          compute_engagement,
+                                          compute_entertainment, compute_motion,
+                                          compute_pulse, compute_stress,
+                                          compute_stress_series)
+from crunch.empatica.measurements.engagement import (FQ, MEAN_KERNEL_WIDTH,
+                                                     OFFSET_THRESHOLD,
+                                                     ONSET_THRESHOLD)
+
+
+@pytest.mark.parametrize("heart_rate", [50, 72, 120, 170])
+def test_pulse(heart_rate):
+    """ Test that the heart rate computed from a synthetic BVP signal matches the pulse frequency """
+    t = np.arange(512) / 64
+    bvp = 50 * np.sin(2 * np.pi * heart_rate / 60 * t) + np.random.normal(0, 1, len(t))
+
+    measured_heart_rate, amplitude = compute_pulse(bvp)
+
+    assert measured_heart_rate == pytest.approx(heart_rate, rel=0.05)
+    assert amplitude == pytest.approx(100, rel=0.1)
+
+
+def test_motion():
+    """ Test that motion artifacts are only detected when the wristband moves """
+    still = np.tile([0.0, 0.0, 64.0], (128, 1))
+    moving = still.copy()
+    moving[::8] = [64.0, 64.0, 64.0]
+
+    still_activity, still_artifacts = compute_motion(still)
+    moving_activity, moving_artifacts = compute_motion(moving)
+
+    assert still_artifacts == 0.01
+    assert moving_artifacts == pytest.approx(31 / 127)
+    assert moving_activity > still_activity
+
+
+def _reference_engagement(eda):
+    """ The original loop implementation of compute_engagement, used to verify the vectorized one """
+    mean_arr = np.array([np.mean(eda[i - MEAN_KERNEL_WIDTH: i + MEAN_KERNEL_WIDTH + 1])
+                         for i in range(MEAN_KERNEL_WIDTH, len(eda) - MEAN_KERNEL_WIDTH)])
+    relevant_eda = eda[MEAN_KERNEL_WIDTH: -MEAN_KERNEL_WIDTH]
+    tonic = mean_arr - abs(min(relevant_eda - mean_arr))
+    phasic = relevant_eda - tonic
+    modified_phasic = relevant_eda - mean_arr
+
+    peak_start = np.zeros(len(modified_phasic))
+    peak_end = np.zeros(len(modified_phasic))
+    rising = ONSET_THRESHOLD < modified_phasic[0] < modified_phasic[1]
+    peak_start[0] = rising
+    for i in range(len(modified_phasic) - 1):
+        if modified_phasic[i] < ONSET_THRESHOLD < modified_phasic[i + 1] and not rising:
+            peak_start[i + 1] = 1
+            rising = True
+        elif modified_phasic[i] > OFFSET_THRESHOLD > modified_phasic[i + 1] and rising:
+            peak_end[i + 1] = 1
+            rising = False
+
+    amplitude = 0
+    for i in range(len(phasic)):
+        if peak_start[i] == 1:
+            j = i
+            while j < len(phasic) and peak_end[j] != 1:
+                j += 1
+            amplitude += max(phasic[i:j + 1])
+
+    auc = sum(tonic[i] / FQ + (tonic[i + 1] - tonic[i]) / FQ / 2 for i in range(len(tonic) - 1))
+    return amplitude, sum(peak_start), auc
+
+
+@pytest.mark.parametrize("length", [42, 121, 2000])
+@pytest.mark.parametrize("noise", [0.001, 0.01, 0.05])
+def test_engagement(length, noise):
+    """ Test that the vectorized engagement features are the same as the ones from the original loops """
+    for _ in range(20):
+        eda = np.cumsum(np.random.normal(0, noise, length)) + 2
+        np.testing.assert_allclose(compute_engagement(eda), _reference_engagement(eda), rtol=1e-9, atol=1e-12)
+
+
+def _reference_approximate_entropy(U, m, r):
+    """ The original list implementation of the approximate entropy, used to verify the vectorized one """
+    def _phi(m):
+        x = [[U[j] for j in range(i, i + m)] for i in range(N - m + 1)]
+        C = [len([1 for x_j in x if max(abs(ua - va) for ua, va in zip(x_i, x_j)) <= r]) / (N - m + 1.0)
+             for x_i in x]
+        return (N - m + 1.0) ** (-1) * sum(np.log(C))
+    N = len(U)
+    return abs(_phi(m + 1) - _phi(m))
+
+
+@pytest.mark.parametrize("length", [5, 20, 300])
+@pytest.mark.parametrize("std", [0.5, 3, 30])
+def test_entertainment(length, std):
+    """ Test that the approximate entropy and autocorrelation are the same as the original implementation """
+    hr = np.round(np.random.normal(75, std, length), 1)
+
+    features = compute_entertainment(hr)
+
+    assert features[6:8] == pytest.approx((sm.tsa.acf(hr, nlags=1, fft=False)[1],
+                                          _reference_approximate_entropy(hr, 2, 3)), rel=1e-9)
+
+
+def _windows(data, window_length, window_step):
+    """ The windows a handler gets from the window store, as read-only views """
+    data = np.asarray(data, dtype=float)
+    data.flags.writeable = False
+    for end in range(window_length, len(data) + 1, window_step):
+        yield data[end - window_length:end]
+
+
+@pytest.mark.parametrize("window_length, window_step", [(121, 40), (121, 1), (20, 20), (10, 15)])
+def test_sliding_arousal(window_length, window_step):
+    """ Test that the sliding arousal is the same as the batch one, also after many updates """
+    eda = np.cumsum(np.random.normal(0, 0.01, 20000)) + 2
+    sliding_arousal = SlidingArousal(window_step)
+    for window in _windows(eda, window_length, window_step):
+        assert sliding_arousal(window) == pytest.approx(compute_arousal(window), rel=1e-9, abs=1e-12)
+
+
+@pytest.mark.parametrize("window_length, window_step", [(12, 12), (12, 4), (40, 1)])
+def test_sliding_emotional_regulation(window_length, window_step):
+    """ Test that the sliding emotional regulation is the same as the batch one """
+    ibi = np.round(np.random.normal(0.8, 0.05, 5000), 3)
+    sliding_emotional_regulation = SlidingEmotionalRegulation(window_step)
+    for window in _windows(ibi, window_length, window_step):
+        assert sliding_emotional_regulation(window) == \
+            pytest.approx(compute_emotional_regulation(window), rel=1e-9, abs=1e-12)
+
+
+def _reference_stress(temps):
+    """ The original polyfit implementation of the stress, used to verify the closed form one """
+    return -np.polyfit([0.25 * i for i in range(len(temps))], temps, 1)[0]
+
+
+@pytest.mark.parametrize("window_length, window_step", [(10, 10), (10, 1), (10, 3), (240, 40)])
+def test_stress(window_length, window_step):
+    """ Test that the closed form, series and sliding stress are the same as the least squares slope """
+    temps = np.round(32 + np.cumsum(np.random.normal(0, 0.02, 5000)), 2)
+    expected = [_reference_stress(window) for window in _windows(temps, window_length, window_step)]
+    sliding_stress = SlidingStress(window_step)
+
+    assert [compute_stress(window) for window in _windows(temps, window_length, window_step)] == \
+        pytest.approx(expected, rel=1e-7, abs=1e-10)
+    assert [sliding_stress(window) for window in _windows(temps, window_length, window_step)] == \
+        pytest.approx(expected, rel=1e-7, abs=1e-10)
+    np.testing.assert_allclose(compute_stress_series(temps, window_length, window_step), expected,
+                               rtol=1e-7, atol=1e-10)
@@ -0,0 +1,50 @@
+import pytest
+
+from crunch.empatica.parser import StreamParser
+
+STREAM = (b"R device_subscribe gsr OK\r\n"
+          b"E4_Gsr 1495312512.2342 0.123456\r\n"
+          b"E4_Temperature 1495312512.2542 33,25\r\n"
+          b"E4_Hr 1495312512.2642 72.5\r\n"
+          b"E4_Ibi 1495312512.2642 0.81\r\n"
+          b"E4_Bvp 1495312512.2742 -12.5\r\n"
+          b"E4_Gsr 1495312512.4842 0.130000\r\n")
+
+
+def test_parse_stream():
+    """ Test that the parser routes every sample to its subscriber name and returns server messages """
+    samples, messages = StreamParser().feed(STREAM)
+
+    assert samples == {"EDA": [0.123456, 0.13], "TEMP": [33.25], "HR": [72.5], "IBI": [0.81], "BVP": [-12.5]}
+    assert messages == ["R device_subscribe gsr OK"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 16, 50])
+def test_parse_split_lines(chunk_size):
+    """ Test that samples split across several recv calls are neither lost nor misparsed """
+    parser = StreamParser()
+    received = {}
+    for i in range(0, len(STREAM), chunk_size):
+        samples, _ = parser.feed(STREAM[i:i + chunk_size])
+        for name, values in samples.items():
+            received.setdefault(name, []).extend(values)
+
+    assert received == StreamParser().feed(STREAM)[0]
+    assert parser.remainder == b""
+
+
+def test_parse_keeps_incomplete_line():
+    """ Test that an incomplete line is kept until the rest of it arrives """
+    parser = StreamParser()
+    samples, _ = parser.feed(b"E4_Gsr 1495312512.2342 0.12")
+
+    assert samples == {}
+    samples, _ = parser.feed(b"3456\r\n")
+    assert samples == {"EDA": [0.123456]}
+
+
+def test_parse_acc():
+    """ Test that the accelerometer samples keep all three axes """
+    samples, _ = StreamParser().feed(b"E4_Acc 1495312512.2342 51 -31 -12\r\nE4_Acc 1495312512.2654 50 -30 -11\r\n")
+
+    assert samples == {"ACC": [(51.0, -31.0, -12.0), (50.0, -30.0, -11.0)]}
@@ -1,6 +1,6 @@
 import unittest
 import numpy as np
-from crunch.forecasting.arma import ARMAClass
+from crunch.forecasting.arma import ARMAClass, ARMAFilter
 
 
 class TestARMAClass(unittest.TestCase):
@@ -47,6 +47,48 @@ class TestARMAClass(unittest.TestCase):
         residuals = armaclass.get_residuals()
         self.assertEqual(len(residuals), len(data))
 
+    def test_filter_matches_statsmodels(self):
+        """
+        Test the ARMAFilter class.
+
+        Filtering a new window with the fixed parameters should give the same forecast and residuals
+        as applying the fitted model to the window with statsmodels.
+        """
+        data = np.random.rand(100)
+        armaclass = ARMAClass(data, p=3, q=2)
+        history = np.random.rand(15)
+        forecast, residuals = ARMAFilter(armaclass.model_fit).filter(history, 10)
+        applied = armaclass.model_fit.apply(history)
+        np.testing.assert_allclose(forecast, applied.forecast(10), atol=1e-8)
+        np.testing.assert_allclose(residuals, applied.resid, atol=1e-8)
+
+    def test_refit_interval(self):
+        """
+        Test that the model is only refitted every refit_interval observations, and filtered in between.
+        """
+        data = np.random.rand(100)
+        armaclass = ARMAClass(data, p=2, q=2, refit_interval=3)
+        fitted = armaclass.model_fit
+        for _ in range(2):
+            forecast = armaclass.update_and_predict(np.random.rand(15))
+            self.assertEqual(len(forecast), 10)
+            self.assertEqual(len(armaclass.get_residuals()), 15)
+            self.assertIs(armaclass.model_fit, fitted)
+        armaclass.update_and_predict(np.random.rand(15))
+        self.assertIsNot(armaclass.model_fit, fitted)
+
+    def test_drift_refits(self):
+        """
+        Test that the model is refitted early when the residuals no longer match the variance of the model.
+        """
+        data = np.random.rand(100)
+        armaclass = ARMAClass(data, p=2, q=2, refit_interval=100, drift_threshold=3)
+        fitted = armaclass.model_fit
+        armaclass.update_and_predict(data[-15:])
+        self.assertIs(armaclass.model_fit, fitted)
+        armaclass.update_and_predict(data[-15:] * 100)
+        self.assertIsNot(armaclass.model_fit, fitted)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,14 @@
+import time
 import unittest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
 import numpy as np
-from crunch.forecasting.garch import GARCHClass
+from arch import arch_model
+
+import crunch.forecasting.garch as garch_module
+from crunch.forecasting.garch import GARCHClass, fit_garch
 
 
 class TestGARCHClass(unittest.TestCase):
@@ -37,6 +45,65 @@ class TestGARCHClass(unittest.TestCase):
         prediction = garch.update_and_predict(new_residuals)
         self.assertIsInstance(prediction, float)
 
+    def test_recursive_variance(self):
+        """
+        Test the update_variance method.
+
+        The conditional variance should continue the conditional volatility of arch with the fitted parameters,
+        and each new residual should update it with the GARCH recursion.
+        """
+        residuals = np.random.randn(100)
+        garch = GARCHClass(residuals, p=1, q=1, refit_interval=1000)
+        model = arch_model(residuals, vol="Garch", p=1, q=1, rescale=False)
+        params = np.concatenate([[garch.mu, garch.omega], garch.alpha, garch.beta])
+        variances = model.fix(params).conditional_volatility ** 2
+        expected = garch.omega + garch.alpha[0] * (residuals[-1] - garch.mu) ** 2 + garch.beta[0] * variances[-1]
+        self.assertAlmostEqual(garch.variance, expected)
+
+        variance = garch.variance
+        garch.update_and_predict(np.append(residuals, 2.0))
+        expected = garch.omega + garch.alpha[0] * (2.0 - garch.mu) ** 2 + garch.beta[0] * variance
+        self.assertAlmostEqual(garch.variance, expected)
+
+    def test_background_refit(self):
+        """
+        Test that the parameters are fitted again in the background every refit_interval observations,
+        and applied once the fit is finished.
+        """
+        residuals = np.random.randn(100)
+        garch = GARCHClass(residuals, p=2, q=2, refit_interval=2)
+        mu = garch.mu
+        new_residuals = residuals + 5
+        for _ in range(500):
+            garch.update_and_predict(new_residuals)
+            if garch.mu != mu:
+                break
+            time.sleep(0.01)
+        self.assertGreater(garch.mu, mu + 4)
+
+    def test_failed_refit(self):
+        """
+        Test that a refit that fails keeps the current parameters, and that a broken process pool
+        is replaced by the background thread for the next refits.
+        """
+        residuals = np.random.randn(100)
+        self.assertIsNone(fit_garch(np.full(100, np.nan), (1, 1)))
+        garch = GARCHClass(residuals, p=1, q=1, refit_interval=1000)
+        mu, omega = garch.mu, garch.omega
+        garch._refit = Future()
+        garch._refit.set_exception(BrokenProcessPool())
+        with mock.patch("builtins.print"):
+            prediction = garch.update_and_predict(np.append(residuals, 2.0))
+        self.assertEqual(prediction, mu)
+        self.assertEqual((garch.mu, garch.omega), (mu, omega))
+        self.assertIsNone(garch._refit)
+
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool()
+        with mock.patch.object(garch_module, "get_executor", return_value=broken):
+            garch.start_refit(residuals)
+        self.assertIsNotNone(garch._refit.result(timeout=10))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,129 @@
+import threading
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import numpy as np
+
+import crunch.forecasting.order_selection as order_selection
+from crunch.forecasting.arma import ARMAClass
+from crunch.forecasting.order_selection import ORDERS, OrderSelector, fit_arma_aic, fit_garch_aic
+
+
+class FakeFit:
+    """ Fit with a known AIC for every order, which remembers the fitted orders """
+
+    def __init__(self, best_order):
+        self.best_order = best_order
+        self.fitted = []
+
+    def __call__(self, history, order):
+        self.fitted.append(order)
+        return abs(order[0] - self.best_order[0]) + abs(order[1] - self.best_order[1])
+
+
+class TestOrderSelector(unittest.TestCase):
+    """
+    Unit test class for OrderSelector.
+
+    """
+
+    def test_select_stops_early(self):
+        """
+        Test that the order with the lowest AIC is found, without fitting the levels after [patience] levels
+        that do not lower the AIC.
+        """
+        fit = FakeFit((2, 3))
+        selector = OrderSelector(fit, "Test", patience=2, executor=ThreadPoolExecutor(2))
+        self.assertEqual(selector.select(np.zeros(10)), (2, 3))
+        self.assertLess(len(fit.fitted), len(ORDERS))
+        self.assertNotIn((5, 5), fit.fitted)
+
+    def test_cache_and_warm_start(self):
+        """
+        Test that the candidates of a window are only fitted once, and a new search starts with the previous best order.
+        """
+        fit = FakeFit((4, 4))
+        selector = OrderSelector(fit, "Test", patience=2, executor=ThreadPoolExecutor(1))
+        selector.select(np.zeros(10))
+        fitted = len(fit.fitted)
+        self.assertEqual(selector.select(np.zeros(10)), (4, 4))
+        self.assertEqual(len(fit.fitted), fitted)
+
+        selector.select(np.ones(10))
+        self.assertEqual(fit.fitted[fitted], (4, 4))
+
+    def test_background_search(self):
+        """
+        Test that a search started in the background returns its order once it is finished.
+        """
+        selector = OrderSelector(FakeFit((3, 5)), "Test", patience=2, executor=ThreadPoolExecutor(1))
+        self.assertIsNone(selector.result())
+        selector.start(np.zeros(10))
+        for _ in range(100):
+            order = selector.result()
+            if order is not None:
+                break
+            time.sleep(0.01)
+        self.assertEqual(order, (3, 5))
+        self.assertIsNone(selector.result())
+
+    def test_arma_applies_new_order(self):
+        """
+        Test that the order of the 41st update is searched and applied to the ARMA model, instead of thrown away.
+        """
+        data = np.random.rand(100)
+        selector = OrderSelector(fit_arma_aic, "ARMA", patience=2, executor=ThreadPoolExecutor(1))
+        armaclass = ARMAClass(data, p=2, q=2, refit_interval=100, order_selector=selector)
+        selector.select = lambda history: (3, 4)
+        armaclass.counter = 41
+        for _ in range(100):
+            armaclass.update_and_predict(data[-15:])
+            if armaclass.p == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual((armaclass.p, armaclass.q), (3, 4))
+        self.assertEqual(armaclass.model_fit.model.order, (3, 0, 4))
+
+    def test_broken_executor(self):
+        """
+        Test that the candidates are fitted one after another when the process pool is broken,
+        and that a failed background search keeps the current order.
+        """
+        broken = mock.Mock()
+        broken.map.side_effect = BrokenProcessPool()
+        fit = FakeFit((3, 4))
+        selector = OrderSelector(fit, "Test", patience=2, executor=broken)
+        with mock.patch("builtins.print"):
+            self.assertEqual(selector.select(np.random.rand(50)), (3, 4))
+            broken.shutdown.assert_called_once()
+
+            selector._search = Future()
+            selector._search.set_exception(BrokenProcessPool())
+            self.assertIsNone(selector.result())
+        self.assertIsNone(selector._search)
+
+    def test_executor_from_thread(self):
+        """
+        Test that the process pool started from a thread, while other threads run, does not fork the process.
+        """
+        previous, order_selection._executor = order_selection._executor, None
+        stop = threading.Event()
+        busy = threading.Thread(target=stop.wait)
+        busy.start()
+        try:
+            with ThreadPoolExecutor(1) as thread:
+                executor = thread.submit(order_selection.get_executor).result()
+            self.assertNotEqual(executor._mp_context.get_start_method(), "fork")
+            self.assertTrue(np.isfinite(executor.submit(fit_garch_aic, np.random.randn(100), (1, 1)).result()))
+            executor.shutdown()
+        finally:
+            stop.set()
+            busy.join()
+            order_selection._executor = previous
+
+
+if __name__ == "__main__":
+    unittest.main()
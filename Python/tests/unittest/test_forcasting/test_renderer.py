@@ -0,0 +1,80 @@
+import queue
+import subprocess
+import sys
+import time
+
+import matplotlib
+import numpy as np
+
+from crunch.forecasting.predictor import Predictor
+from crunch.forecasting.renderer import BackgroundRenderer, PlotSnapshot, _put_latest, create_renderer
+
+matplotlib.use("Agg")
+
+BASELINE = np.array([2.72, 2.6, 2.76, 4.44, 4.56, 4.4, 4.16, 4.44, 4.08, 4.48, 4.48, 4.76, 4.56, 4.4, 4.12])
+
+
+def make_snapshot(number_of_observations, error=0.5):
+    return PlotSnapshot(np.linspace(-1, 1, 11), np.zeros(11), np.full(10, 0.3), [error] * 5, number_of_observations)
+
+
+def test_headless_skips_pyplot():
+    """ Test that a headless predictor forecasts without importing pyplot """
+    code = ("import sys, numpy as np; from crunch.forecasting.predictor import Predictor; "
+            f"p = Predictor(np.array({BASELINE.tolist()}), plotting='headless'); p.update_and_predict(3.5); "
+            "print('matplotlib.pyplot' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines()[-1] == "False"
+
+
+def test_put_latest_replaces():
+    """ Test that a new item replaces the item in a full mailbox instead of waiting """
+    mailbox = queue.Queue(maxsize=1)
+    _put_latest(mailbox, 1)
+    _put_latest(mailbox, 2)
+    assert mailbox.get_nowait() == 2
+    assert mailbox.empty()
+
+
+def test_inline_renderer_draws():
+    """ Test that the plots are updated with the newest snapshot, and the error axis grows with the errors """
+    renderer = create_renderer("inline", 11, 10)
+    renderer.submit(make_snapshot(20))
+    renderer.submit(make_snapshot(21, error=3))
+    plotting = renderer.plotting
+    assert plotting.observation_text.get_text() == "Observation Nr. 21"
+    np.testing.assert_array_equal(plotting.forecast_line.get_ydata(), np.append(1, np.full(10, 0.3)))
+    assert plotting.mse_ax.get_ylim()[1] >= 3
+    renderer.close()
+
+
+def test_thread_renderer_never_blocks():
+    """ Test that submitting to a background renderer returns right away, and the renderer stops when closed """
+    renderer = BackgroundRenderer("thread", 11, 10)
+    start = time.perf_counter()
+    for number in range(100):
+        renderer.submit(make_snapshot(number))
+    assert time.perf_counter() - start < 0.5
+    renderer.close()
+    assert not renderer.worker.is_alive()
+
+
+def test_process_renderer_without_fork():
+    """ Test that the process renderer is not forked from the threads of the predictor, and stops when closed """
+    renderer = BackgroundRenderer("process", 11, 10)
+    assert renderer.worker._start_method != "fork"
+    renderer.submit(make_snapshot(1))
+    renderer.close()
+    # Starting a process without fork takes a while, so wait longer than close does
+    renderer.worker.join(timeout=30)
+    assert renderer.worker.exitcode == 0
+
+
+def test_predictor_submits_snapshots():
+    """ Test that the predictor hands a snapshot of every forecast to its renderer """
+    predictor = Predictor(BASELINE, plotting="headless")
+    snapshots = []
+    predictor.renderer = type("Renderer", (), {"submit": lambda self, snapshot: snapshots.append(snapshot)})()
+    predictor.update_and_predict(3.5)
+    assert snapshots[-1].number_of_observations == len(BASELINE) + 1
+    np.testing.assert_array_equal(snapshots[-1].forecast, predictor.current_forecast)
@@ -0,0 +1,156 @@
+import multiprocessing
+import select
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+import crunch.util as util
+import crunch.writer as writer
+from crunch.transport import MeasurementTransport, SharedRing, close_transport, set_transport
+
+
+@pytest.fixture
+def transport():
+    transport = MeasurementTransport(capacity=16)
+    yield transport
+    transport.close()
+
+
+def _wait(transport, timeout=5):
+    """ Wait until the transport has new rows, like the event loop of the websocket server """
+    readable, _, _ = select.select([transport.fileno()], [], [], timeout)
+    return bool(readable)
+
+
+def test_ring():
+    """ Test that a reader gets every record once, and loses the oldest ones when it falls behind """
+    ring = SharedRing(["time", "value"], 8)
+    reader = SharedRing(ring.columns, 8, ring.name)
+    for i in range(5):
+        ring.append([i, i * 2])
+    rows, start, dropped = reader.read(0)
+    np.testing.assert_array_equal(rows, [[i, i * 2] for i in range(5)])
+    assert (start, dropped) == (5, 0)
+
+    for i in range(5, 25):
+        ring.append([i, i * 2])
+    rows, start, dropped = reader.read(start)
+    np.testing.assert_array_equal(rows[:, 0], np.arange(17, 25))
+    assert (start, dropped) == (25, 12)
+    assert len(reader.read(start)[0]) == 0
+    ring.close()
+    reader.close(unlink=True)
+
+
+def _append(name, columns, count):
+    ring = SharedRing(columns, 4, name)
+    for i in range(1, count + 1):
+        ring.append([i] * len(columns))
+    ring.close()
+
+
+def test_ring_race():
+    """ Test that a reader racing the writer on a full ring never gets a record that is half written """
+    columns = [str(i) for i in range(256)]
+    ring = SharedRing(columns, 4)
+    count = 20000
+    writer = multiprocessing.get_context("fork").Process(target=_append, args=(ring.name, columns, count))
+    writer.start()
+
+    start = 0
+    while start < count:
+        rows, end, dropped = ring.read(start)
+        # Every record is complete, and the records follow the ones that were lost
+        assert np.all(rows == rows[:, :1])
+        np.testing.assert_array_equal(rows[:, 0], np.arange(start + dropped, end) + 1)
+        start = end
+    writer.join()
+    ring.close(unlink=True)
+
+
+def test_publish(transport):
+    """ Test that the rows of every stream are received in order, with the column names """
+    assert not _wait(transport, 0)
+    for i in range(10):
+        transport.publish("engagement.csv", [i, i, 2 * i, 3 * i], ["amplitude", "nr of peaks"])
+        transport.publish("arousal.csv", [i, -i])
+
+    assert _wait(transport, 0)
+    received = {path: (columns, rows) for path, columns, rows in transport.receive()}
+    assert received["engagement.csv"][0] == ["time", "value", "amplitude", "nr of peaks"]
+    np.testing.assert_array_equal(received["engagement.csv"][1][:, 2], 2 * np.arange(10))
+    np.testing.assert_array_equal(received["arousal.csv"][1][:, 1], -np.arange(10))
+    assert not _wait(transport, 0)
+    assert transport.receive() == []
+
+
+def test_publish_while_receiving(transport, monkeypatch):
+    """ Test that a row published while the wakeup pipe is drained wakes up the receiver """
+    transport.publish("arousal.csv", [0, 0])
+    poll = transport._wakeup_reader.poll
+    published = []
+
+    def publish_once():
+        if not published:
+            published.append(True)
+            transport.publish("arousal.csv", [1, 1])
+        return poll()
+
+    monkeypatch.setattr(transport._wakeup_reader, "poll", publish_once)
+    assert _wait(transport, 0)
+    assert transport.receive()[0][2][:, 1].tolist() == [0, 1]
+    monkeypatch.undo()
+
+    transport.publish("arousal.csv", [2, 2])
+    assert _wait(transport, 0)
+    assert transport.receive()[0][2][:, 1].tolist() == [2]
+
+
+def _publish(transport, count):
+    set_transport(transport)
+    for i in range(count):
+        util.write_csv("cognitive_load.csv", [float(i)])
+        time.sleep(0.001)
+    close_transport()
+
+
+def test_processes(transport, monkeypatch):
+    """ Test that the rows published by another process are all received, in order """
+    monkeypatch.setattr(writer, "get_writer", lambda: None)
+    process = multiprocessing.get_context("fork").Process(target=_publish, args=(transport, 200))
+    process.start()
+
+    values = []
+    while len(values) < 200:
+        assert _wait(transport)
+        for path, columns, rows in transport.receive():
+            assert path == "cognitive_load.csv"
+            values += rows[:, 1].tolist()
+    process.join()
+
+    assert values == list(range(200))
+    assert transport.dropped == 0
+
+
+def test_rows_after_publisher_stops(transport, monkeypatch):
+    """ Test that the rows of a process that stopped before they were received are not lost, and freed on close """
+    monkeypatch.setattr(writer, "get_writer", lambda: None)
+    process = multiprocessing.get_context("fork").Process(target=_publish, args=(transport, 10))
+    process.start()
+    process.join()
+
+    assert _wait(transport, 0)
+    received = transport.receive()
+    assert received[0][2][:, 1].tolist() == list(range(10))
+    name = transport._streams["cognitive_load.csv"][0].name
+
+    # A ring announced after the last receive is freed as well
+    ring = SharedRing(["time", "value"], transport.capacity)
+    transport._announcements.put(("arousal.csv", ring.name, ring.columns))
+    ring.close()
+    transport.close()
+    for freed in [name, ring.name]:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=freed)
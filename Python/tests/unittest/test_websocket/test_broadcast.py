@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+
+from crunch.websocket.broadcast import BroadcastHub, ClientQueue
+from crunch.websocket.encoding import Forecast
+from crunch.websocket.websocket import WebSocketServer
+
+
+def test_drop_oldest():
+    """ Test that a full queue drops its oldest messages """
+    queue = ClientQueue(3, "drop_oldest")
+    for i in range(5):
+        queue.put(i, key="arousal")
+
+    assert len(queue) == 3
+    assert queue.dropped == 2
+    assert list(queue.messages.values()) == [2, 3, 4]
+
+
+def test_coalesce():
+    """ Test that a new message replaces the queued message of the same stream """
+    queue = ClientQueue(3, "coalesce")
+    for i in range(5):
+        queue.put(("arousal", i), key="arousal")
+        queue.put(("stress", i), key="stress")
+
+    assert list(queue.messages.values()) == [("arousal", 4), ("stress", 4)]
+    assert queue.dropped == 8
+
+
+def test_slow_client():
+    """ Test that a client that does not read does not stop the others from getting every message """
+    async def run():
+        hub = BroadcastHub(8, "drop_oldest")
+        slow = hub.register()
+        fast = hub.register()
+        received = []
+        for i in range(100):
+            hub.publish(i)
+            received.append(await fast.get())
+        hub.unregister(slow)
+        return hub, received
+
+    hub, received = asyncio.run(run())
+    assert received == list(range(100))
+    assert hub.stats() == {"clients": 1, "published": 100, "dropped": 92, "queued": 0, "max_queue_depth": 0}
+
+
+def test_no_clients():
+    hub = BroadcastHub(8, "drop_oldest")
+    for i in range(100):
+        hub.publish(i)
+    assert hub.stats()["queued"] == 0
+
+
+@pytest.mark.parametrize("clients", [1, 2, 30])
+def test_broadcast(clients):
+    """ Test that every connected client gets every message """
+    server = WebSocketServer()
+
+    async def run():
+        async with websockets.serve(server.handler, "127.0.0.1", 0) as websocket_server:
+            port = websocket_server.sockets[0].getsockname()[1]
+            connections = [await websockets.connect(f"ws://127.0.0.1:{port}") for _ in range(clients)]
+            while server.hub.stats()["clients"] < clients:
+                await asyncio.sleep(0.01)
+            for i in range(50):
+                server.hub.publish(Forecast("cognitive_load", i))
+            received = [[json.loads(await connection.recv())["Current cognitive load"] for _ in range(50)]
+                        for connection in connections]
+            for connection in connections:
+                await connection.close()
+            return received
+
+    received = asyncio.run(run())
+    assert received == [list(range(50))] * clients
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+import websockets
+
+from crunch.websocket.encoding import Forecast, decode_float32, negotiate_encoding
+from crunch.websocket.websocket import WebSocketServer
+
+
+def test_json():
+    """ Test that the forecast is a numeric JSON array, and Need help stays a string for the Typescript listener """
+    forecast = Forecast("cognitive_load", np.float64(0.5), np.array([0.25, -1.5]), np.bool_(True))
+
+    assert json.loads(forecast.encode("json")) == {"Stream": "cognitive_load",
+                                                   "Forecasted cognitive load": [0.25, -1.5], "Need help": "True"}
+    assert forecast.encode("json") is forecast.encode("json")
+
+
+def test_float32():
+    forecast = Forecast("C13A64_arousal", 0.5, np.linspace(-2, 2, 10), False)
+
+    stream, value, values, need_help = decode_float32(forecast.encode("float32"))
+    assert (stream, need_help) == ("C13A64_arousal", False)
+    assert np.isnan(value)
+    np.testing.assert_allclose(values, np.linspace(-2, 2, 10), rtol=1e-6)
+    assert len(forecast.encode("float32")) < len(forecast.encode("json")) / 3
+
+
+def test_value_without_forecast():
+    """ Test that a value sent before its forecast has no forecast and no Need help """
+    value = Forecast("cognitive_load", 0.5)
+
+    assert json.loads(value.encode("json")) == {"Stream": "cognitive_load", "Current cognitive load": 0.5}
+    stream, current, values, need_help = decode_float32(value.encode("float32"))
+    assert (stream, current, len(values), need_help) == ("cognitive_load", 0.5, 0, False)
+
+
+def test_msgpack():
+    msgpack = pytest.importorskip("msgpack")
+    forecast = Forecast("cognitive_load", 0.5, [0.25, -1.5], False)
+
+    assert msgpack.unpackb(forecast.encode("msgpack")) == forecast.to_dict()
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("/") == "json"
+    assert negotiate_encoding(None) == "json"
+    assert negotiate_encoding("/?encoding=float32") == "float32"
+    assert negotiate_encoding("/?encoding=xml") == "json"
+
+
+@pytest.mark.parametrize("compression", [None, "deflate"])
+def test_clients_with_different_encodings(compression):
+    """ Test that each client gets the forecasts in the encoding it asked for, with or without compression """
+    server = WebSocketServer()
+
+    async def run():
+        async with websockets.serve(server.handler, "127.0.0.1", 0) as websocket_server:
+            url = f"ws://127.0.0.1:{websocket_server.sockets[0].getsockname()[1]}"
+            json_client = await websockets.connect(url, compression=compression)
+            float32_client = await websockets.connect(url + "/?encoding=float32", compression=compression)
+            while server.hub.stats()["clients"] < 2:
+                await asyncio.sleep(0.01)
+            server.hub.publish(Forecast("cognitive_load", 0.5, [0.25, 1.0], True))
+            received = await json_client.recv(), await float32_client.recv()
+            await json_client.close()
+            await float32_client.close()
+            return received
+
+    text, binary = asyncio.run(run())
+    assert json.loads(text)["Need help"] == "True"
+    stream, _, forecast, need_help = decode_float32(binary)
+    assert (stream, forecast.tolist(), need_help) == ("cognitive_load", [0.25, 1.0], True)
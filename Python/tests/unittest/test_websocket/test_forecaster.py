@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+import websockets
+
+import crunch.forecasting.predictor as predictor
+from crunch.websocket.forecaster import Forecaster
+from crunch.websocket.predictors import PredictorRegistry
+from crunch.websocket.websocket import WebSocketServer
+
+
+class SlowPredictor:
+    """ Mock predictor that takes a while to forecast the last value it has received """
+    def __init__(self, baseline_data):
+        self.values = list(baseline_data)
+        self.forecasted = []
+        self.is_outlier = False
+
+    def update_and_predict(self, value):
+        time.sleep(0.05)
+        self.values.append(value)
+        self.forecasted.append(value)
+
+    def observe(self, value):
+        self.values.append(value)
+
+    def close(self):
+        pass
+
+    @property
+    def current_forecast(self):
+        return [self.values[-1]]
+
+
+@pytest.fixture(autouse=True)
+def slow_predictor(monkeypatch):
+    monkeypatch.setattr(predictor, "Predictor", SlowPredictor)
+
+
+def test_skip_stale_forecasts():
+    """ Test that values that arrive during a forecast are forecasted at once, and only the newest one is forecasted """
+    registry = PredictorRegistry(baseline_items=2, idle_timeout=60)
+
+    async def run():
+        published = []
+        forecaster = Forecaster(registry, "thread", published.append)
+        for value in range(20):
+            forecaster.submit("arousal", value)
+            await asyncio.sleep(0.005)
+        while forecaster.running or forecaster.mailboxes:
+            await asyncio.sleep(0.01)
+        forecaster.close()
+        return forecaster, published
+
+    forecaster, published = asyncio.run(run())
+    stream = registry.streams["arousal"].predictor
+    assert stream.values == list(range(20))
+    assert len(stream.forecasted) < 18
+    assert forecaster.skipped > 0
+    assert published[-1].value == 19
+    assert [forecast.value for forecast in published] == sorted(forecast.value for forecast in published)
+
+
+def test_values_sent_before_forecast():
+    """ Test that a value is sent to the clients right away, and its forecast when it is finished """
+    server = WebSocketServer()
+    server.predictors.baseline_items = 1
+
+    async def run():
+        client = server.hub.register()
+        server.dispatch("arousal", [0.5])
+        value = client.messages.copy()
+        await asyncio.wait_for(client.get(), 1)
+        forecast = await asyncio.wait_for(client.get(), 1)
+        server.forecaster.close()
+        return list(value.values()), forecast
+
+    value, forecast = asyncio.run(run())
+    assert [message.to_dict() for message in value] == [{"Stream": "arousal", "Current cognitive load": 0.5}]
+    assert forecast.to_dict()["Forecasted cognitive load"] == [0.5]
+
+
+def test_forecast_never_shows_older_value():
+    """ Test that a forecast that finishes after a newer value was sent does not show its older value again """
+    server = WebSocketServer()
+    server.predictors.baseline_items = 1
+
+    async def run():
+        client = server.hub.register()
+        server.dispatch("cognitive_load", [2.0])
+        # The forecast of 2.0 is still running when 3.0 is sent
+        server.dispatch("cognitive_load", [3.0])
+        received = []
+        while server.forecaster.running or server.forecaster.mailboxes or client.messages:
+            received.append((await asyncio.wait_for(client.get(), 1)).to_dict())
+        server.forecaster.close()
+        return received
+
+    received = asyncio.run(run())
+    assert any("Forecasted cognitive load" in message for message in received)
+    # The status bar of the Typescript extension shows the current value of every message, in the order received
+    shown = [message["Current cognitive load"] for message in received if "Current cognitive load" in message]
+    assert shown == [2.0, 3.0]
+
+
+def test_server_closes_forecaster(monkeypatch):
+    """ Test that the forecasting executor is shut down when the server stops """
+    server = WebSocketServer()
+
+    async def serve(*args, **kwargs):
+        pass
+
+    async def stop():
+        raise OSError("The output directory can not be watched")
+
+    monkeypatch.setattr(websockets, "serve", serve)
+    monkeypatch.setattr(server, "watcher", stop)
+    # start_websocket runs on the event loop of the main thread, which asyncio.run of other tests has closed
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with pytest.raises(OSError):
+        server.start_websocket()
+    asyncio.set_event_loop(None)
+    loop.close()
+    with pytest.raises(RuntimeError):
+        server.forecaster.executor.submit(print)
+
+
+def test_evict_without_new_values():
+    """ Test that the predictor of an idle stream is removed when no stream receives values anymore """
+    server = WebSocketServer()
+    server.predictors.baseline_items = 1
+    server.predictors.idle_timeout = 0.05
+    server.evict_interval = 0.01
+
+    async def run():
+        client = server.hub.register()
+        server.dispatch("arousal", [0.5])
+        await asyncio.wait_for(client.get(), 1)
+        await asyncio.wait_for(client.get(), 1)
+        assert list(server.predictors.streams) == ["arousal"]
+        evictor = asyncio.ensure_future(server.evictor())
+        for _ in range(100):
+            if not server.predictors.streams:
+                break
+            await asyncio.sleep(0.01)
+        evictor.cancel()
+        server.forecaster.close()
+
+    asyncio.run(run())
+    assert server.predictors.streams == {}
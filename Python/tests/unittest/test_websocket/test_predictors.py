@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import crunch.forecasting.predictor as predictor
+from crunch.websocket.predictors import PredictorRegistry, stream_name
+
+
+class MockPredictor:
+    """ Mock predictor that forecasts the mean of all values it has received """
+    def __init__(self, baseline_data):
+        self.values = list(baseline_data)
+        self.is_outlier = False
+        self.closed = False
+
+    def update_and_predict(self, value):
+        self.values.append(value)
+
+    def close(self):
+        self.closed = True
+
+    @property
+    def current_forecast(self):
+        return np.mean(self.values)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(predictor, "Predictor", MockPredictor)
+    return PredictorRegistry(baseline_items=3, idle_timeout=60)
+
+
+def test_stream_name():
+    assert stream_name("./crunch/output/arousal.csv") == "arousal"
+    assert stream_name("crunch/output/C13A64_engagement.20261018-120000-42.seg") == "C13A64_engagement"
+
+
+def test_separate_streams(registry):
+    """ Test that each stream gets its own baseline and forecast, tagged with the stream name """
+    assert registry.update("arousal", 1, now=0) is None
+    assert registry.update("stress", 100, now=0) is None
+    assert registry.update("arousal", 2, now=0) is None
+    forecast = registry.update("arousal", 3, now=0)
+    assert forecast.value == 3.0
+    assert forecast.to_dict() == {"Stream": "arousal", "Forecasted cognitive load": [2.0], "Need help": "False"}
+    assert registry.streams["arousal"].predictor.values == [1, 2, 3]
+    assert registry.streams["stress"].predictor is None
+
+    registry.update("arousal", 6, now=0)
+    assert registry.streams["arousal"].predictor.values == [1, 2, 3, 6]
+
+
+def test_evict_idle(registry):
+    """ Test that a stream without new values for idle_timeout seconds is removed, and starts over after that """
+    for value in range(3):
+        registry.update("arousal", value, now=0)
+    registry.update("stress", 1, now=50)
+    evicted = registry.streams["arousal"].predictor
+
+    assert registry.evict_idle(now=100) == ["arousal"]
+    assert evicted.closed
+    assert list(registry.streams) == ["stress"]
+    assert registry.update("arousal", 1, now=100) is None
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+from crunch.segment_store import SegmentFile
+from crunch.websocket.tailer import Tailer
+
+
+def _append(path, text):
+    with open(path, "a") as file:
+        file.write(text)
+
+
+def test_csv(tmp_path):
+    """ Test that every appended row is read once, and a row that is still being written is read the next time """
+    path = str(tmp_path / "arousal.csv")
+    tailer = Tailer()
+    _append(path, "time,value\n1.0,0.5\n2.0,0.6\n")
+    np.testing.assert_array_equal(tailer.read(path), [[1.0, 0.5], [2.0, 0.6]])
+    assert tailer.read(path).size == 0
+
+    _append(path, "3.0,0.7\n4.0,0.")
+    np.testing.assert_array_equal(tailer.read(path), [[3.0, 0.7]])
+    _append(path, "8\n5.0,0.9\n")
+    np.testing.assert_array_equal(tailer.read(path), [[4.0, 0.8], [5.0, 0.9]])
+
+
+def test_truncate_and_rotate(tmp_path):
+    """ Test that a truncated or replaced file is read from the start """
+    path = str(tmp_path / "arousal.csv")
+    tailer = Tailer()
+    _append(path, "time,value\n1.0,0.5\n2.0,0.6\n")
+    tailer.read(path)
+
+    with open(path, "w") as file:
+        file.write("time,value\n3.0,0.7\n")
+    np.testing.assert_array_equal(tailer.read(path), [[3.0, 0.7]])
+
+    rotated = str(tmp_path / "rotated.csv")
+    _append(rotated, "time,value\n4.0,0.8\n5.0,0.9\n6.0,1.0\n")
+    os.replace(rotated, path)
+    np.testing.assert_array_equal(tailer.read(path)[:, 0], [4.0, 5.0, 6.0])
+
+    os.remove(path)
+    assert tailer.read(path).size == 0
+    assert path not in tailer.files
+
+
+def test_skip_existing(tmp_path):
+    """ Test that rows from earlier sessions are skipped """
+    path = str(tmp_path / "arousal.csv")
+    _append(path, "time,value\n1.0,0.5\n")
+    tailer = Tailer()
+    tailer.skip_existing(str(tmp_path))
+
+    assert tailer.read(path).size == 0
+    _append(path, "2.0,0.6\n")
+    np.testing.assert_array_equal(tailer.read(path), [[2.0, 0.6]])
+
+
+def test_segment(tmp_path):
+    """ Test that the complete records of a binary segment are read """
+    path = str(tmp_path / "engagement.1.seg")
+    segment = SegmentFile(path, ["time", "value", "amplitude"])
+    tailer = Tailer()
+    assert tailer.read(path).size == 0
+
+    for i in range(5):
+        segment.writerow([i, i, i])
+    segment.file.write(np.zeros(2).tobytes())
+    segment.flush()
+    np.testing.assert_array_equal(tailer.read(path)[:, 0], np.arange(5))
+
+    segment.file.write(np.zeros(1).tobytes())
+    segment.writerow([6, 6, 6])
+    segment.close()
+    np.testing.assert_array_equal(tailer.read(path), [[0, 0, 0], [6, 6, 6]])
@@ -0,0 +1,76 @@
+import csv
+
+import numpy as np
+import pytest
+
+from crunch.segment_store import (SegmentFile, export_csv, last_rows, latest_segment, main, read_segment,
+                                  segment_path)
+from crunch.writer import MeasurementWriter
+
+
+def test_segment(tmp_path):
+    """ Test that the records of a segment can be read back with the column names """
+    path = segment_path(str(tmp_path), "engagement.csv", "session")
+    columns = ["time", "value", "amplitude", "nr of peaks"]
+    data = np.random.rand(100, 4)
+    segment = SegmentFile(path, columns)
+    for row in data:
+        segment.writerow(list(row))
+    segment.close()
+
+    read_columns, rows = read_segment(path)
+    assert read_columns == columns
+    np.testing.assert_array_equal(rows, data)
+    assert not rows.flags.writeable
+    np.testing.assert_array_equal(last_rows(path, 10)[1], data[-10:])
+    np.testing.assert_array_equal(last_rows(path, 1000)[1], data)
+
+
+def test_partial_record(tmp_path):
+    """ Test that a record that is only partly written is left out """
+    path = str(tmp_path / "arousal.seg")
+    segment = SegmentFile(path, ["time", "value"])
+    assert len(read_segment(path)[1]) == 0
+    segment.writerow([1, 2])
+    segment.file.write(b"\0" * 12)
+    segment.close()
+
+    np.testing.assert_array_equal(read_segment(path)[1], [[1, 2]])
+
+
+def test_read_invalid(tmp_path):
+    path = tmp_path / "arousal.seg"
+    path.write_bytes(b"time,value\n" * 4)
+    with pytest.raises(ValueError):
+        read_segment(str(path))
+
+
+def test_writer_sessions(tmp_path, monkeypatch):
+    """
+    Test that every writer starts a new segment, and that the latest one can be exported to csv
+    in the current directory, outside the output directory the websocket server watches
+    """
+    for session in range(2):
+        writer = MeasurementWriter(str(tmp_path), flush_rows=10, flush_interval=1, fsync="never",
+                                   file_format="binary")
+        writer.session = str(session)
+        for i in range(25):
+            writer.write("engagement.csv", [session, i], header_features=["amplitude"])
+        writer.close()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["engagement.0.seg", "engagement.1.seg"]
+    segment = latest_segment(str(tmp_path), "engagement.csv")
+    columns, rows = read_segment(segment)
+    assert columns == ["time", "value", "amplitude"]
+    np.testing.assert_array_equal(rows[:, 1:], [[1, i] for i in range(25)])
+
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    monkeypatch.chdir(exports)
+    main([segment])
+    assert sorted(path.name for path in tmp_path.glob("*.*")) == ["engagement.0.seg", "engagement.1.seg"]
+    with open(exports / "engagement.1.csv", newline="") as file:
+        exported = list(csv.reader(file))
+    assert exported[0] == columns
+    assert np.array(exported[1:], dtype=float).tolist() == rows.tolist()
+    assert export_csv(segment, str(tmp_path / "out.csv")) == str(tmp_path / "out.csv")
@@ -0,0 +1,100 @@
+import csv
+import os
+import time
+
+import pytest
+
+from crunch.writer import CsvFile, MeasurementWriter
+
+
+def _read_rows(path):
+    with open(path, newline="") as file:
+        return list(csv.reader(file))
+
+
+@pytest.mark.parametrize("fsync", MeasurementWriter.fsync_policies)
+def test_write(tmp_path, fsync):
+    """ Test that the rows are written after the header, in order and with the time they were written """
+    writer = MeasurementWriter(str(tmp_path), flush_rows=16, flush_interval=60, fsync=fsync)
+    start = time.time()
+    for i in range(100):
+        writer.write("engagement.csv", [i, i * 2], header_features=["amplitude"])
+        writer.write("arousal.csv", [i])
+    writer.close()
+
+    engagement = _read_rows(tmp_path / "engagement.csv")
+    assert engagement[0] == ["time", "value", "amplitude"]
+    assert [row[1:] for row in engagement[1:]] == [[str(i), str(i * 2)] for i in range(100)]
+    timestamps = [float(row[0]) for row in engagement[1:]]
+    assert start <= timestamps[0] and timestamps == sorted(timestamps)
+    assert [row[1] for row in _read_rows(tmp_path / "arousal.csv")[1:]] == [str(i) for i in range(100)]
+
+
+class FlushSpy:
+    """ Counts the rows written to the csv files, and the number of rows written each time they are flushed """
+
+    def __init__(self):
+        self.written = 0
+        self.flushes = []
+
+
+@pytest.fixture
+def spy(monkeypatch):
+    spy = FlushSpy()
+
+    def writerow(self, row):
+        spy.written += 1
+
+    def flush(self):
+        spy.flushes.append(spy.written)
+
+    monkeypatch.setattr(CsvFile, "writerow", writerow)
+    monkeypatch.setattr(CsvFile, "flush", flush)
+    return spy
+
+
+@pytest.mark.parametrize("flush_rows, expected", [(10, [10, 20, 25]), (0, [1, 2, 3, 3])])
+def test_flush_rows(tmp_path, spy, flush_rows, expected):
+    """ Test that the rows are kept in the buffer until flush_rows rows are written, and flushed on every row with 0 """
+    writer = MeasurementWriter(str(tmp_path), flush_rows=flush_rows, flush_interval=60, fsync="never")
+    for i in range(expected[-1]):
+        writer.write("arousal.csv", [i])
+    writer.close()
+
+    assert spy.flushes == expected
+
+
+def test_flush_interval_clock(tmp_path, spy):
+    """ Test that a row written flush_interval seconds after the first unflushed row flushes the files """
+    # 100 seconds pass between the second and the third row
+    writer = MeasurementWriter(str(tmp_path), flush_rows=1000, flush_interval=60, fsync="never",
+                               clock=lambda: 100 if spy.written >= 3 else 0)
+    for i in range(4):
+        writer.write("arousal.csv", [i])
+    writer.close()
+
+    assert spy.flushes == [3, 4]
+
+
+def test_flush_interval(tmp_path):
+    """ Test that the rows are flushed when flush_interval seconds have passed, without new rows """
+    writer = MeasurementWriter(str(tmp_path), flush_rows=1000, flush_interval=0.05, fsync="never")
+    writer.write("arousal.csv", [1])
+    path = tmp_path / "arousal.csv"
+    deadline = time.monotonic() + 5
+    while (not path.exists() or len(_read_rows(path)) < 2) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(_read_rows(path)) == 2
+    writer.close()
+
+
+def test_append(tmp_path):
+    """ Test that a new writer appends to an existing file without a second header """
+    for _ in range(2):
+        writer = MeasurementWriter(str(tmp_path), flush_rows=10, flush_interval=1, fsync="never")
+        writer.write("arousal.csv", [1])
+        writer.close()
+
+    assert len(_read_rows(tmp_path / "arousal.csv")) == 3
+    assert os.listdir(tmp_path) == ["arousal.csv"]
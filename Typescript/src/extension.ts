@@ -92,6 +92,11 @@ export function updateStatusBarData(data: RawData) {
 
   let outputJson = JSON.parse(data.toString());
 
+  // Forecasts are sent after their values, without the current value
+  if (outputJson["Current cognitive load"] === undefined) {
+    return;
+  }
+
   statusBarItem.text =
     "cognitive load: " + outputJson["Current cognitive load"];
 }
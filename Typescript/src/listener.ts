@@ -23,6 +23,12 @@ export function setUp(AIInitiateHelp: boolean) {
   });
 
   ws.on("message", function message(data) {
+    // The server forecasts every output stream, the extension only shows cognitive load
+    let stream = JSON.parse(data.toString())["Stream"];
+    if (stream !== undefined && stream != "cognitive_load") {
+      return;
+    }
+
     if (initialMessage && !AIInitiateHelp) {
       initialMessage = false;
       initializeHelpButton();